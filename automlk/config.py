@@ -2,9 +2,12 @@ METRIC_NULL = 1e7
 SEARCH_QUEUE = 'controller:search_queue'
 DUPLICATE_QUEUE = 'controller:duplicate_queue'
 RESULTS_QUEUE = 'controller:results_queue'
+WAKE_QUEUE = 'controller:wake_queue'
 CONTROLLER_ID = 'controller:dataset_id'
+INFLIGHT_WORKERS = 'controller:inflight'
 
 USE_REDIS = False
+USE_SQLITE = False
 
 
 def set_use_redis(value):
@@ -23,4 +26,23 @@ def get_use_redis():
     get global value USE_REDIS
     :return: value USE_REDIS
     """
-    return USE_REDIS
\ No newline at end of file
+    return USE_REDIS
+
+
+def set_use_sqlite(value):
+    """
+    set global value USE_SQLITE
+
+    :param value:
+    :return:
+    """
+    global USE_SQLITE
+    USE_SQLITE = value
+
+
+def get_use_sqlite():
+    """
+    get global value USE_SQLITE
+    :return: value USE_SQLITE
+    """
+    return USE_SQLITE
@@ -1,8 +1,17 @@
 import os
 import json
-from .config import set_use_redis
+from .config import set_use_redis, set_use_sqlite
 from .xyset import XySet
 
+JOB_LEASE_MIN = 30           # minimum duration in seconds of a lease (renewed every 10 seconds by the worker)
+
+# default values of the options of the config file (see set_config)
+CONFIG_DEFAULTS = {'bootstrap': '', 'graph_theme': 'dark', 'doc_theme': 'default', 'store_cache': 0,
+                   'store_codec': 'json', 'search_prefetch': 1, 'job_lease': 0, 'worker_cpus': 1, 'worker_cache': 1000,
+                   'pp_cache': 0, 'model_compress': 0, 'model_rank': 0, 'search_halving': 0,
+                   'search_sampler': 'random', 'search_pruning': 0, 'ensemble_start': 100, 'ensemble_ratio': 2,
+                   'ensemble_policy': 'fixed'}
+
 
 def get_dataset_folder(dataset_id):
     """
@@ -22,18 +31,16 @@ def get_config():
     if os.path.exists('../config.json'):
         with open('../config.json', 'r') as f:
             config = eval("".join(f.readlines()))
-            # upward compatibility
-            if 'bootstrap' not in config.keys():
-                config['bootstrap'] = ''
-            if 'graph_theme' not in config.keys():
-                config['graph_theme'] = 'dark'
-            if 'doc_theme' not in config.keys():
-                config['doc_theme'] = 'default'
-            return config
+            # upward compatibility: the options missing in the file have their default value
+            return {**CONFIG_DEFAULTS, **config}
     raise EnvironmentError('configuration file %s not found' % '../config.json')
 
 
-def set_config(data, theme, bootstrap, graph_theme, store, store_url):
+def set_config(data, theme, bootstrap, graph_theme, store, store_url, store_cache=None, store_codec=None,
+               search_prefetch=None, job_lease=None, worker_cpus=None, worker_cache=None,
+               pp_cache=None, model_compress=None, model_rank=None,
+               search_halving=None, search_sampler=None, search_pruning=None,
+               ensemble_start=None, ensemble_ratio=None, ensemble_policy=None):
     """
     set config data
 
@@ -41,8 +48,23 @@ def set_config(data, theme, bootstrap, graph_theme, store, store_url):
     :param theme: theme for user interface
     :param bootstrap: specific url for a bootstrap
     :param graph_theme: style for graphs (dark / white)
-    :param store: store mode (redis / file)
+    :param store: store mode (redis / file / sqlite)
     :param store_url: url if redis mode
+    :param store_cache: time to live in seconds of the values in the process cache (0 = no cache, None = unchanged)
+    :param store_codec: encoding of the values in redis and sqlite store (json / msgpack, None = unchanged)
+    :param search_prefetch: number of jobs queued in advance per busy worker (None = unchanged)
+    :param job_lease: duration in seconds of the lease of a job in a worker (0 = no lease, None = unchanged)
+    :param worker_cpus: number of processors used by a worker for the cross validation (None = unchanged)
+    :param worker_cache: memory in MB for the datasets kept in a worker between jobs (None = unchanged)
+    :param pp_cache: disk space in MB per dataset for the results of pre-processing (0 = no cache, None = unchanged)
+    :param model_compress: compression level of the saved models, from 1 to 9 (0 = no compression, None = unchanged)
+    :param model_rank: models saved only for the rounds in this rank of the leaderboard (0 = all, None = unchanged)
+    :param search_halving: reduction factor of the successive halving search (0 = random search, None = unchanged)
+    :param search_sampler: sampler of the params of the models: random or tpe (None = unchanged)
+    :param search_pruning: rounds stopped after a fold when out of this rank (0 = no pruning, None = unchanged)
+    :param ensemble_start: number of rounds before the first round with ensembles (None = unchanged)
+    :param ensemble_ratio: one round with ensembles every ensemble_ratio rounds (0 = no ensembles, None = unchanged)
+    :param ensemble_policy: ratio of the ensembles: fixed, or adaptive to their gain (None = unchanged)
     :return:
     """
     # check data
@@ -58,15 +80,30 @@ def set_config(data, theme, bootstrap, graph_theme, store, store_url):
         except:
             raise EnvironmentError('could not connect to redis')
         set_use_redis(True)
+        set_use_sqlite(False)
     else:
+        # file store or sqlite database in the store folder
         store_folder = data + '/store'
         if not os.path.exists(store_folder):
             os.makedirs(store_folder)
         set_use_redis(False)
+        set_use_sqlite(store == 'sqlite')
+
+    # the options not given are unchanged: from the current config file, or default values
+    current = get_config() if os.path.exists('../config.json') else CONFIG_DEFAULTS
+    options = {'store_cache': store_cache, 'store_codec': store_codec, 'search_prefetch': search_prefetch,
+               'job_lease': job_lease, 'worker_cpus': worker_cpus, 'worker_cache': worker_cache, 'pp_cache': pp_cache,
+               'model_compress': model_compress, 'model_rank': model_rank, 'search_halving': search_halving,
+               'search_sampler': search_sampler, 'search_pruning': search_pruning, 'ensemble_start': ensemble_start,
+               'ensemble_ratio': ensemble_ratio, 'ensemble_policy': ensemble_policy}
+    options = {k: current[k] if v is None else v for k, v in options.items()}
+    if 0 < options['job_lease'] < JOB_LEASE_MIN:
+        # a shorter lease would expire between two renewals
+        options['job_lease'] = JOB_LEASE_MIN
 
     # then save config
     config = {'data': data, 'theme': theme, 'bootstrap': bootstrap, 'graph_theme': graph_theme, 'store': store,
-              'store_url': store_url}
+              'store_url': store_url, **options}
     with open('../config.json', 'w') as f:
         f.write(json.dumps(config) + '\n')
 
@@ -1,49 +1,98 @@
 import logging
 import uuid
+import math
 from .config import *
 from .store import *
-from .context import get_uploads_folder
+from .context import get_uploads_folder, get_config
 from .dataset import get_dataset_ids, get_dataset
 from .textset import create_textset, get_textset_status
 from .solutions import *
 from .solutions_pp import *
 from .worker import get_search_rounds
-from .monitor import heart_beep
+from .leaderboard import Leaderboard, config_key
+from .monitor import heart_beep, get_workers_load
 from .graphs import graph_history_search, graph_history_scan
 from .specific import *
 from .prepare import prepare_dataset_sets
+from .spaces.hyper import get_random_params, get_tpe_params
+from .scheduler import get_round_ids, get_round_origin, get_ensemble_ratio
 
 PATIENCE = 500               # number of equivalent results to wait before stop
 ROUNDS_MAX = 5000            # number max of rounds before stop
 RATIO_START_THRESHOLD = 10   # number of results to start applying a threshold
-ROUND_START_ENSEMBLE = 100   # number of results to start ensembles
-RATIO_L1_L2 = 2              # number of L1 rounds compared to L2 rounds
 
 RATIO_ROUNDS = 10            # number rounds -> equivalent in number of results (only a fraction can pass threshold)
 RATIO_MIN = 2                # minimum models to include in threshold (should be > 1)
 RATIO_THRESHOLD_MAX = 50     # maximum % of models to include in threshold (should be > 1)
 RATIO_THRESHOLD_SLOPE = 10   # % of models decrease per 50 results to include in threshold (should be > 1)
 
+LEADERBOARD_REFRESH = 20     # minimum number of results between updates of the history graphs without any change
+CONTROLLER_WAIT = 1          # maximum waiting time in seconds for a result before checking the datasets
+WORKERS_REFRESH = 30         # delay in seconds to refresh the number of workers from the heart beeps
+WORKERS_ALIVE_DELAY = 30     # maximum age in seconds of the last heart beep of a worker still running
+LEASE_CHECK = 10             # delay in seconds between checks of the leases of the jobs in progress
+LEASE_RETRIES = 2            # number max of times a job is sent again after the expiry of its lease
+DUPLICATE_RETRIES = 10       # number max of samplings of a configuration not yet evaluated, before skipping the round
+
+# leaderboards of the datasets in search, updated with each result
+__leaderboards = {}
+
+# number of results at the last update of the history graphs: dataset_id -> n
+__graphs_n = {}
+
+# ratio of the rounds at level 2 and its origin (see get_round_ids), also in the store: dataset_id -> (ratio, origin)
+__schedules = {}
+
+# target depth of the search queue, from the heart beeps of the workers
+__queue_depth = 1
+__queue_time = 0
+
+# jobs sent in the search queue: dataset_id -> {round_id: job}
+__queued = {}
+
+# jobs withdrawn from the search queue when the search is paused, to be sent again: dataset_id -> list of jobs
+__withdrawn = {}
+
 log = logging.getLogger(__name__)
 
 
 def controller_loop():
     """
     controller process: manages the search strategy and send instruction to workers
+
+    the controller waits for the results of the workers, and keeps the search queue filled with a number of jobs
+    depending on the number of workers
     :return:
     """
     i_dataset = -1
+    t_beep = 0
+    t_lease = 0
+    msg_beep = {}
     # controls the optimization rounds and sends instructions to the workers
     while True:
         # check the list of datasets to search
         active = [id for id in get_dataset_ids() if get_key_store('dataset:%s:status' % id) == 'searching']
 
+        # send again the jobs of the workers with an expired lease
+        if get_config()['job_lease'] > 0 and time.time() - t_lease > LEASE_CHECK:
+            __requeue_expired_jobs()
+            t_lease = time.time()
+
+        # withdraw the jobs of the datasets no more in search, and forget the jobs already taken by the workers
+        __withdraw_jobs(active)
+        depth = llen_key_store(SEARCH_QUEUE)
+        __forget_taken_jobs(depth)
+
         if len(active) == 0:
-            heart_beep('controller', {})
-            time.sleep(1)
+            msg_beep = {}
         else:
-            # sends work to the workers when their queue is empty
-            if llen_key_store(SEARCH_QUEUE) == 0:
+            # sends work to the workers until the queue reaches the target depth
+            n_jobs = __queue_target() - depth
+            # each dataset is visited at most once per job missing, and no more once no job can be created
+            blocked = set()
+            for i in range(max(0, n_jobs) * len(active)):
+                if n_jobs <= 0 or len(blocked) == len(active):
+                    break
                 # get next dataset to search
                 i_dataset += 1
                 if i_dataset > len(active) - 1:
@@ -51,34 +100,159 @@ def controller_loop():
 
                 # retrieves dataset and status of search
                 dataset_id = active[i_dataset]
+                if dataset_id in blocked:
+                    continue
 
-                # find search job
-                msg_search = __create_search_round(dataset_id)
+                # find search job: the jobs withdrawn when the search was paused are sent first
+                msg_search = __get_withdrawn_job(dataset_id)
+                if msg_search is None:
+                    msg_search = __create_search_round(dataset_id)
 
                 # send queue the next job to do
                 if msg_search != {}:
-                    log.info('sending %s' % msg_search)
-                    lpush_key_store(SEARCH_QUEUE, msg_search)
-                    heart_beep('controller', msg_search)
+                    __send_job(msg_search)
+                    n_jobs -= 1
+                    msg_beep = msg_search
+                else:
+                    blocked.add(dataset_id)
 
         # then read the duplicate ROUND queue
         while llen_key_store(DUPLICATE_QUEUE) > 0:
             msg = brpop_key_store(DUPLICATE_QUEUE)
+            if msg is None:
+                break
             msg_search = __duplicate_search_round(msg['round'], msg['dataset'])
 
             # send queue the next job to do
-            log.info('sending %s' % msg_search)
-            lpush_key_store(SEARCH_QUEUE, msg_search)
-            heart_beep('controller', msg_search)
-
-        # then read the results queue
-        while llen_key_store(RESULTS_QUEUE) > 0:
+            __send_job(msg_search)
+            msg_beep = msg_search
+
+        # heart beep with the last job sent, at most every second
+        if time.time() - t_beep >= 1:
+            heart_beep('controller', msg_beep)
+            t_beep = time.time()
+
+        # then wait for a result, or for a job taken by a worker (the queue is then filled again), and read all the
+        # results arrived
+        e = brpop_keys_store([RESULTS_QUEUE, WAKE_QUEUE], CONTROLLER_WAIT)
+        msg_result = None
+        if e is not None and e[0] == RESULTS_QUEUE:
+            msg_result = e[1]
+        elif e is not None:
+            # a single wake up for all the jobs taken
+            del_key_store(WAKE_QUEUE)
+        while msg_result is not None:
+            __process_result(msg_result)
+            if llen_key_store(RESULTS_QUEUE) == 0:
+                break
             msg_result = brpop_key_store(RESULTS_QUEUE)
-            if msg_result is not None:
-                __process_result(msg_result)
 
-        # then wait 1 second
-        time.sleep(1)
+
+def __queue_target():
+    """
+    number of jobs to keep in the search queue: one per idle worker, and search_prefetch per busy worker
+
+    :return: target depth of the queue
+    """
+    global __queue_depth, __queue_time
+    if time.time() - __queue_time > WORKERS_REFRESH:
+        idle, busy = get_workers_load(WORKERS_ALIVE_DELAY)
+        __queue_depth = max(1, idle + int(math.ceil(get_config()['search_prefetch'] * busy)))
+        __queue_time = time.time()
+    return __queue_depth
+
+
+def __send_job(msg_search):
+    """
+    sends a job in the search queue
+
+    :param msg_search: job
+    :return:
+    """
+    log.info('sending %s' % msg_search)
+    lpush_key_store(SEARCH_QUEUE, msg_search)
+    __queued.setdefault(msg_search['dataset_id'], {})[msg_search['round_id']] = msg_search
+
+
+def __withdraw_jobs(active):
+    """
+    removes from the search queue the jobs of the datasets no more in search
+
+    the jobs removed are kept to be sent again if the search is resumed, and are discarded if the search is reset
+
+    :param active: list of the datasets in search
+    :return:
+    """
+    for dataset_id in [d for d in __queued.keys() if d not in active]:
+        jobs = [job for job in __queued.pop(dataset_id).values() if lrem_key_store(SEARCH_QUEUE, job)]
+        if len(jobs) > 0:
+            log.info('withdrawn %d jobs of dataset %s' % (len(jobs), dataset_id))
+            __withdrawn[dataset_id] = sorted(jobs, key=lambda job: job['round_id']) + __withdrawn.get(dataset_id, [])
+
+
+def __forget_taken_jobs(depth):
+    """
+    removes from the jobs sent the ones no more in the search queue: taken by a worker, they cannot be withdrawn, and
+    some of them will have no result (eg. outliers, errors)
+
+    the queue is read only when it is shorter than the number of jobs sent (a job left in the list of jobs sent is
+    harmless: its withdrawal fails)
+
+    :param depth: length of the search queue
+    :return:
+    """
+    n = sum([len(jobs) for jobs in __queued.values()])
+    if n == 0 or depth >= n:
+        return
+    if depth == 0:
+        __queued.clear()
+        return
+    in_queue = set([(job['dataset_id'], job['round_id']) for job in list_key_store(SEARCH_QUEUE)])
+    for dataset_id in list(__queued.keys()):
+        jobs = {round_id: job for round_id, job in __queued[dataset_id].items() if (dataset_id, round_id) in in_queue}
+        if len(jobs) > 0:
+            __queued[dataset_id] = jobs
+        else:
+            __queued.pop(dataset_id)
+
+
+def __requeue_expired_jobs():
+    """
+    sends again in the search queue the jobs in progress in workers with an expired lease (eg. worker killed)
+
+    :return:
+    """
+    for worker_id in smembers_key_store(INFLIGHT_WORKERS) or []:
+        lease = get_key_store('%s:%s:lease' % (INFLIGHT_WORKERS, worker_id))
+        if lease is not None and lease > time.time():
+            continue
+        while True:
+            msg_search = rpop_key_store('%s:%s' % (INFLIGHT_WORKERS, worker_id))
+            if msg_search is None:
+                break
+            retries = msg_search.get('retries', 0)
+            if retries >= LEASE_RETRIES:
+                log.info('job abandoned after %d retries: %s' % (retries, msg_search))
+                continue
+            log.info('lease of worker %s expired: job sent again' % worker_id)
+            __send_job({**msg_search, 'retries': retries + 1})
+
+
+def __get_withdrawn_job(dataset_id):
+    """
+    returns the next job withdrawn from the search queue, if the search has not been reset since
+
+    :param dataset_id: id of the dataset
+    :return: job or None
+    """
+    jobs = __withdrawn.get(dataset_id, [])
+    if len(jobs) == 0:
+        return None
+    round_counter = get_key_store('dataset:%s:round_counter' % dataset_id)
+    if isinstance(round_counter, int) and jobs[-1]['round_id'] < round_counter:
+        return jobs.pop(0)
+    __withdrawn.pop(dataset_id, None)
+    return None
 
 
 def __create_search_round(dataset_id):
@@ -86,17 +260,62 @@ def __create_search_round(dataset_id):
 
     dataset = get_dataset(dataset_id)
 
-    # generate round id
-    round_id = incr_key_store('dataset:%s:round_counter' % dataset_id) - 1
-    if round_id == 0:
-        # first launch: create train & eval & test set
-        prepare_dataset_sets(dataset)
-
     # check if text set is completed
     if len(dataset.text_cols) > 0:
         if not __check_text_sets(dataset):
             return {}
 
+    # the round id is allocated only when a job is created (the round counter is updated only by the controller)
+    round_id = get_counter_store('dataset:%s:round_counter' % dataset_id)
+    if round_id == 0:
+        # first launch: create train & eval & test set
+        prepare_dataset_sets(dataset)
+        __leaderboards.pop(dataset_id, None)
+        __withdrawn.pop(dataset_id, None)
+        __graphs_n.pop(dataset_id, None)
+        __schedules.pop(dataset_id, None)
+        del_key_store('dataset:%s:schedule' % dataset_id)
+        del_key_store('dataset:%s:seen' % dataset_id)
+        del_key_store('dataset:%s:searches' % dataset_id)
+        del_key_store('dataset:%s:pruned' % dataset_id)
+        del_key_store('dataset:%s:promoted' % dataset_id)
+
+    # the configurations already sent are sampled again for the same round (with the next model in the choices)
+    for retry in range(DUPLICATE_RETRIES):
+        msg_search = __sample_search_round(dataset, round_id, retry)
+        if msg_search['mode'] in ['search', 'halving'] and msg_search.get('parent') is None:
+            lb = __get_leaderboard(dataset_id)
+            key = config_key(msg_search)
+            if not lb.is_new(key):
+                result = lb.configs.get(key)
+                if result is None:
+                    log.info('round %d: duplicate of a configuration in progress' % round_id)
+                else:
+                    log.info('round %d: duplicate of round %d with score %s' % (round_id, result[0], result[1]))
+                continue
+            # the configurations sent are kept in the store, in order not to be sent again after a restart
+            lb.sent(key)
+            sadd_key_store('dataset:%s:seen' % dataset_id, key)
+        incr_key_store('dataset:%s:round_counter' % dataset_id)
+        if msg_search.get('parent') is not None:
+            # promotions sent, not to be sent again if the leaderboard is rebuilt before their results
+            rpush_key_store('dataset:%s:promoted' % dataset_id, msg_search['parent'])
+        return msg_search
+
+    # no new configuration drawn: the round is skipped (and the round id not used), the result being already known
+    log.info('round %d skipped: no new configuration after %d samplings' % (round_id, DUPLICATE_RETRIES))
+    return {}
+
+
+def __sample_search_round(dataset, round_id, retry=0):
+    """
+    samples the configuration of a search round
+
+    :param dataset: dataset object
+    :param round_id: id of the round
+    :param retry: number of configurations of the round already sampled as duplicates (the models are taken in turn)
+    :return: search message
+    """
     # initialize search parameters
     level = 1
     mode = 'scan'
@@ -104,7 +323,8 @@ def __create_search_round(dataset_id):
     cv = True
     ensemble_depth = 0
     threshold_sel, threshold_cv = 0, 0
-    df = pd.DataFrame()
+    lb = None
+    promoted = None
 
     # generate model and model params
     l1_choices = __get_model_class_list(dataset, 1)
@@ -135,44 +355,85 @@ def __create_search_round(dataset_id):
             mode = 'default'
     else:
         mode = 'search'
-        # get search history
-        df = get_search_rounds(dataset_id)
+        # get best results of the search
+        lb = __get_leaderboard(dataset.dataset_id)
         # find threshold
-        threshold_sel, threshold_cv = __focus_threshold(df, round_id)
-        level, round_id_l1, round_id_l2 = __get_round_ids(round_id)
+        threshold_sel, threshold_cv = __focus_threshold(lb, round_id)
+        level, round_id_l1, round_id_l2 = __get_round_ids(dataset.dataset_id, round_id, lb)
         log.info('get_ids: round_id:%d, level=%d, l1=%d, l2=%d' % (round_id, level, round_id_l1, round_id_l2))
 
         if level == 2:
             l2_choices = __get_model_class_list(dataset, 2)
-            i_choice = round_id_l2 % len(l2_choices)
+            i_choice = (round_id_l2 + retry) % len(l2_choices)
             ref = l2_choices[i_choice]
             ensemble_depth = random.randint(1, 3)
+        elif lb.halving is not None:
+            # successive halving: the configurations promoted are run first on the budget of their next rung
+            mode = 'halving'
+            promoted = lb.halving.next_promotion()
+            if promoted is None:
+                ref = __get_focus_choice(lb, l1_choices, round_id_l1 + retry, threshold_sel)
+            else:
+                ref = promoted['solution']
+                log.info('round %d promoted to rung %d' % (promoted['round_id'], promoted['rung'] + 1))
         else:
-            # focus on models > threshold
-            if threshold_sel != 0:
-                l1_choices = [x[0] for x in __get_list_best_models(df) if x[1] <= threshold_sel]
-                log.info('focusing on %s' % l1_choices)
-            i_choice = round_id_l1 % len(l1_choices)
-            ref = l1_choices[i_choice]
+            ref = __get_focus_choice(lb, l1_choices, round_id_l1 + retry, threshold_sel)
 
         solution = model_solutions_map[ref]
-        params = get_random_params(solution.space_params)
-
-    # check params
-    rule = solution.rule_params
-    if rule is not None:
-        params = rule(dataset, params)
+        if promoted is not None:
+            params = promoted['model_params']
+        elif get_config()['search_sampler'] == 'tpe':
+            params = get_tpe_params(solution.space_params, lb.history(solution.ref))
+        else:
+            params = get_random_params(solution.space_params)
 
-    # generate pre-processing pipeline and pre-processing params
-    if level == 1:
-        pipeline = __get_pipeline(dataset, solution, mode, round_id_l1, df, threshold_sel)
+    if promoted is not None:
+        # same configuration with a larger budget
+        pipeline = promoted['pipeline']
     else:
-        pipeline = [('FR-PASS', 'feature', 'No Feature selection', {})]
+        # check params
+        rule = solution.rule_params
+        if rule is not None:
+            params = rule(dataset, params)
+
+        # generate pre-processing pipeline and pre-processing params
+        if level == 1:
+            pipeline = __get_pipeline(dataset, solution, mode, round_id_l1, lb, threshold_sel)
+        else:
+            pipeline = [('FR-PASS', 'feature', 'No Feature selection', {})]
 
     # generate search message
-    return {'dataset_id': dataset.dataset_id, 'round_id': round_id, 'solution': solution.ref, 'level': level,
-            'ensemble_depth': ensemble_depth, 'model_name': solution.name, 'model_params': params, 'pipeline': pipeline,
-            'threshold': threshold_cv, 'pct': pct, 'cv': cv, 'mode': mode, 'time_limit': __time_limit(dataset)}
+    msg_search = {'dataset_id': dataset.dataset_id, 'round_id': round_id, 'solution': solution.ref, 'level': level,
+                  'ensemble_depth': ensemble_depth, 'model_name': solution.name, 'model_params': params,
+                  'pipeline': pipeline, 'threshold': threshold_cv, 'pct': pct, 'cv': cv, 'mode': mode,
+                  'time_limit': __time_limit(dataset)}
+    if mode == 'halving':
+        # rung of the configuration, and round of the same configuration in the previous rung
+        rung = 0 if promoted is None else promoted['rung'] + 1
+        msg_search['pct'], msg_search['cv'] = lb.halving.budget(rung)
+        msg_search['rung'] = rung
+        msg_search['parent'] = None if promoted is None else promoted['round_id']
+    if lb is not None and msg_search['cv'] and get_config()['search_pruning'] > 0:
+        # the round is stopped after a fold when it cannot reach the best results
+        msg_search['prune'] = lb.fold_thresholds(level, get_config()['search_pruning'])
+    return msg_search
+
+
+def __get_focus_choice(lb, l1_choices, round_id_l1, threshold_sel):
+    """
+    model of a new configuration at level 1, among the best models when the search is focused
+
+    :param lb: leaderboard of the search
+    :param l1_choices: list of the models at level 1
+    :param round_id_l1: id of the round at level 1
+    :param threshold_sel: threshold of the focus (0 = no focus)
+    :return: ref of the model
+    """
+    if threshold_sel != 0:
+        # focus on models > threshold
+        l1_choices = [x[0] for x in lb.list_best_models() if x[1] <= threshold_sel]
+        log.info('focusing on %s' % l1_choices)
+    return l1_choices[round_id_l1 % len(l1_choices)]
 
 
 def __prepare_text_sets(dataset):
@@ -261,42 +522,39 @@ def __duplicate_search_round(round, dataset_id):
             'threshold': 0, 'time_limit': __time_limit(dataset), 'pct': 1., 'cv': True, 'mode': 'search'}
 
 
-def __get_round_ids(round_id):
-    # find round ids for each level; return = level, round_id_l1, round_id_l2
-
-    if round_id < ROUND_START_ENSEMBLE:
-        return 1, round_id, -1
-    round_id_l1 = -1
-    round_id_l2 = -1
-    for i in range(round_id + 1):
-        if i >= ROUND_START_ENSEMBLE and i % RATIO_L1_L2 == 0:
-            round_id_l2 += 1
-        else:
-            round_id_l1 += 1
-    if round_id >= ROUND_START_ENSEMBLE and round_id % RATIO_L1_L2 == 0:
-        return 2, round_id_l1, round_id_l2
-    else:
-        return 1, round_id_l1, round_id_l2
+def __get_round_ids(dataset_id, round_id, lb):
+    # find round ids for each level with the policy of the scheduler; return = level, round_id_l1, round_id_l2
+    # (when the ratio changes, the indexes continue from the rounds already counted at each level)
+    config = get_config()
+    ratio = get_ensemble_ratio(config['ensemble_ratio'], config['ensemble_policy'], lb.stall(2))
+    if dataset_id not in __schedules:
+        schedule = get_key_store('dataset:%s:schedule' % dataset_id)
+        __schedules[dataset_id] = (ratio, (0, 0, 0)) if schedule is None else (schedule[0], tuple(schedule[1]))
+    previous, origin = __schedules[dataset_id]
+    if ratio != previous:
+        origin = get_round_origin(round_id, config['ensemble_start'], previous, origin)
+        __schedules[dataset_id] = (ratio, origin)
+        set_key_store('dataset:%s:schedule' % dataset_id, [ratio, list(origin)])
+    return get_round_ids(round_id, config['ensemble_start'], ratio, origin)
 
 
-def __focus_threshold(df, round_id):
+def __focus_threshold(lb, round_id):
     """
     calculates the threshold for outliers from the score history
 
-    :param df:
+    :param lb: leaderboard of the search
     :param round_id:
     :return: threshold for selection and for cv
     """
-    if len(df) < RATIO_START_THRESHOLD:
+    if lb.n < RATIO_START_THRESHOLD:
         return 0, 0
 
-    df0 = df[(df.cv_max != METRIC_NULL) & ((df.level == 1) & df.cv)].groupby('model_name', as_index=False).min()
-    scores = np.sort(df0.cv_max.values)
+    scores = lb.focus_scores()
     if len(scores) < 5:
         return 0, 0
 
     # we take into account the length of results, but also we cap the round_id (1/10):
-    base = max(len(df), round_id / RATIO_ROUNDS) - RATIO_START_THRESHOLD
+    base = max(lb.n, round_id / RATIO_ROUNDS) - RATIO_START_THRESHOLD
 
     # we will decrease the threshold from max % of the best scores to min%
     ratio = RATIO_THRESHOLD_MAX - base * RATIO_THRESHOLD_SLOPE / 50
@@ -318,13 +576,13 @@ def __time_limit(dataset):
         return 6 * 3600
 
 
-def __get_pipeline(dataset, solution, mode, i_round, df, threshold):
+def __get_pipeline(dataset, solution, mode, i_round, lb, threshold):
     # generates the list of potential data pre-processing depending on the problem type
     pipeline = []
     if threshold == 0:
         best_pp = None
     else:
-        best_pp = __get_list_best_pp(df, cv_max=True)
+        best_pp = lb.list_best_pp()
 
     # missing values
     if len(dataset.missing_cols) > 0:
@@ -431,135 +689,82 @@ def __process_result(msg_result):
         log.info('round %s skipped because greater than current counter' % msg_result['round_id'])
         return
 
-    # update search history
-    rpush_key_store('dataset:%s:rounds' % dataset_id, msg_result)
+    __queued.get(dataset_id, {}).pop(msg_result['round_id'], None)
 
-    # get search history
-    df = get_search_rounds(dataset_id)
+    # update search history and best results
+    lb = __get_leaderboard(dataset_id)
+    if msg_result['round_id'] in lb.round_ids:
+        # job sent again after the expiry of the lease of a slow worker: only the first result is kept
+        log.info('round %s skipped because its result has already been received' % msg_result['round_id'])
+        return
+    if msg_result.get('pruned', False):
+        # partial result: kept apart from the search history, for the sampling of the params only
+        rpush_key_store('dataset:%s:pruned' % dataset_id, msg_result)
+        lb.add_pruned(msg_result)
+        return
+    rpush_key_store('dataset:%s:rounds' % dataset_id, msg_result)
+    changed = lb.add(msg_result)
+
+    # the best models and pre-processing are updated only when they have changed, and the numbers of searches with
+    # each result (see get_best_models and get_best_pp)
+    with batch_key_store():
+        set_key_store('dataset:%s:results' % dataset_id, lb.n)
+        set_key_store('dataset:%s:searches' % dataset_id, lb.search_counts())
+        if 'models' in changed:
+            set_key_store('dataset:%s:best' % dataset_id, lb.best_models())
+        if 'pp' in changed:
+            set_key_store('dataset:%s:best_pp' % dataset_id, lb.best_pp())
 
     dataset = get_dataset(dataset_id)
 
-    # check number of results with cv:
-    n_cv = len(df[df.cv == 1])
-    select_cv = [True] if (n_cv > 5) else [True, False]
-
     # generate graphs
 
-    # scan graph
+    # scan graph, from the scan results kept in the leaderboard
     if msg_result['mode'] == 'scan':
-        best_scan = df[df['mode'] == 'scan'].sort_values(by=['solution', 'cv_mean']). \
+        df = pd.DataFrame(lb.scan)
+        best_scan = df.sort_values(by=['solution', 'cv_mean']). \
                         groupby('solution', as_index=False).first().sort_values(by='cv_mean').model_name.values[:5]
         graph_history_scan(dataset, df, best_scan)
 
-    # history graphs
-    best = __get_best_models(df, select_cv)
-    graph_history_search(dataset, df[df.cv.isin(select_cv)], best[best.level == 1], 1)
-    graph_history_search(dataset, df[df.cv.isin(select_cv)], best[best.level == 2], 2)
-
-    # then update search
-    set_key_store('dataset:%s:results' % dataset_id, len(df))
-    set_key_store('dataset:%s:best' % dataset_id, best.to_dict(orient='records'))
-    set_key_store('dataset:%s:best_pp' % dataset_id, __get_best_pp(df, select_cv))
+    # the history graphs are updated when the best models have changed, or periodically with an interval growing
+    # with the history (the complete history is read for these graphs)
+    last = __graphs_n.get(dataset_id, 0)
+    if 'models' in changed or lb.n - last >= max(LEADERBOARD_REFRESH, last):
+        __graphs_n[dataset_id] = lb.n
+        df = get_search_rounds(dataset_id)
+        df_best = pd.DataFrame(lb.best_models())
+        select_cv = list(lb.select_cv)
+        graph_history_search(dataset, df[df.cv.isin(select_cv)], df_best[df_best.level == 1], 1)
+        graph_history_search(dataset, df[df.cv.isin(select_cv)], df_best[df_best.level == 2], 2)
 
     # then check patience
-    if len(best[best.level == 2] > 0):
-        last_best, last_best_id = __get_last_best(df)
-        if msg_result['round_id'] - last_best_id > PATIENCE:
+    if 2 in lb.levels:
+        if msg_result['round_id'] - lb.best_round > PATIENCE:
             log.info('patience reached for dataset %s at round %d (last best: %d): search completed' % (
-                dataset_id, msg_result['round_id'], last_best_id))
+                dataset_id, msg_result['round_id'], lb.best_round))
             set_key_store('dataset:%s:status' % dataset_id, 'completed')
 
 
-def __get_last_best(df):
-    # returns last best value and its index
-    best = METRIC_NULL
-    round_best = -1
-    for round_id, score in zip(df.round_id.values, df.cv_mean.values):
-        if score < best:
-            best = score
-            round_id = round_id
-    return best, round_id
-
-
-def __get_list_best_models(df, level=1):
-    # returns best models
-    if len(df[(df.level == level) & df.cv]) < 1:
-        return []
-    best = df[(df.level == level) & df.cv].sort_values(by=['solution', 'cv_max']). \
-        groupby('solution', as_index=False).first().sort_values(by='cv_max')
-    return [(x, y) for x, y in zip(best.solution.values, best.cv_max.values)]
-
-
-def __get_best_models(df0, select_cv):
-    # get the best results per model
-    df = df0[df0.cv.isin(select_cv)]
-    if len(df) < 1:
-        return pd.DataFrame()
-    best = df.sort_values(by=['model_name', 'cv_mean']).groupby('model_name', as_index=False).first().sort_values(
-        by='cv_mean').fillna('')
-    counts = df[['model_name', 'round_id']].groupby('model_name', as_index=False).count()
-    counts.columns = ['model_name', 'searches']
-    # relative performance
-    best['rel_score'] = abs(100 * (best.cv_mean - best.cv_mean.max()) / (best.cv_mean.max() - best.cv_mean.min()))
-    return pd.merge(best, counts, on='model_name')
-
-
-def __get_list_best_pp(df, cv_max=False):
-    # get the best results per pre-processing
-    l = []
-    for cat, l_cat in __get_best_pp(df, [True], cv_max):
-        for p in l_cat:
-            l.append((p['cat_ref'], cat, p['cv_max']))
-    return l
-
-
-def __get_best_pp(df, select_cv, cv_max=False):
-    # get the best results per pre-processing
-
-    df = df[df.cv.isin(select_cv)][(df.level == 1) & (df.mode != 'scan')].copy()
-    if len(df) < 1:
-        return []
-
-    # find categories used for this model
-    cat = []
-    for p in df.pipeline.values:
-        cat += [s[1] for s in p if not isinstance(s, dict)]
-    cat = set(cat)
-
-    # for each category, we will want to find the best model
-    all_cat = []
-    for c in PP_CATEGORIES:
-        if c in cat:
-            df['cat_ref'] = df['pipeline'].map(lambda x: __select_cat(c, x)[0])
-            df['cat_name'] = df['pipeline'].map(lambda x: __select_cat(c, x)[1])
-            df['cat_process'] = df['pipeline'].map(lambda x: __select_cat(c, x)[2])
-            df['cat_params'] = df['pipeline'].map(lambda x: __select_cat(c, x)[3])
-            if cv_max:
-                best = df.sort_values(by=['cat_ref', 'cv_max']).groupby('cat_ref', as_index=False).first().sort_values(
-                    by='cv_max').fillna('')
-            else:
-                best = df.sort_values(by=['cat_ref', 'cv_mean']).groupby('cat_ref', as_index=False).first().sort_values(
-                    by='cv_mean').fillna('')
-
-            counts = df[['cat_ref', 'round_id']].groupby('cat_ref', as_index=False).count()
-            counts.columns = ['cat_ref', 'searches']
-
-            # relative performance
-            if cv_max:
-                best['rel_score'] = abs(
-                    100 * (best.cv_max - best.cv_max.max()) / (best.cv_max.max() - best.cv_max.min()))
-            else:
-                best['rel_score'] = abs(
-                    100 * (best.cv_mean - best.cv_mean.max()) / (best.cv_mean.max() - best.cv_mean.min()))
-
-            all_cat.append((c, pd.merge(best, counts, on='cat_ref').to_dict(orient='records')))
-
-    return all_cat
-
+def __get_leaderboard(dataset_id):
+    """
+    returns the leaderboard of the dataset, rebuilt from the search history when not in line with the history
 
-def __select_cat(c, pipeline):
-    # select the element in the pipeline with category c
-    for p in pipeline:
-        if p[1] == c:
-            return p
-    return '', '', '', ''
+    :param dataset_id: id of the dataset
+    :return: leaderboard
+    """
+    lb = __leaderboards.get(dataset_id)
+    if lb is None or lb.n != llen_key_store('dataset:%s:rounds' % dataset_id) or \
+            lb.n_pruned != llen_key_store('dataset:%s:pruned' % dataset_id):
+        lb = Leaderboard(get_config()['search_halving'])
+        for msg in list_key_store('dataset:%s:rounds' % dataset_id):
+            lb.add(msg)
+        for msg in list_key_store('dataset:%s:pruned' % dataset_id):
+            lb.add_pruned(msg)
+        if lb.halving is not None:
+            for round_id in list_key_store('dataset:%s:promoted' % dataset_id):
+                lb.halving.dispatched(round_id)
+        for key in smembers_key_store('dataset:%s:seen' % dataset_id):
+            if key not in lb.configs:
+                lb.sent(key)
+        __leaderboards[dataset_id] = lb
+    return lb
@@ -32,10 +32,33 @@ def get_dataset_list(include_results=False):
     :param include_results: flag to determine if the status are also retrieved (default = False)
     :return: list of datasets objects or empty list if error (eg. redis or environment not set)
     """
-    # try:
-    return [get_dataset(dataset_id, include_results) for dataset_id in get_dataset_ids()]
-    # except:
-    #    return []
+    # all the keys of the datasets are retrieved in a single access to the store
+    dataset_ids = get_dataset_ids()
+    suffixes = __get_dataset_suffixes(include_results)
+    values = mget_key_store(['dataset:%s%s' % (dataset_id, suffix) for dataset_id in dataset_ids
+                             for suffix in suffixes])
+    n = len(suffixes)
+    return [__make_dataset_values(values[i * n:(i + 1) * n], include_results) for i in range(len(dataset_ids))]
+
+
+def get_dataset_version(dataset_id):
+    """
+    get the version of a dataset, updated with each modification of the dataset, its eval set or its metrics
+
+    :param dataset_id: id of the dataset
+    :return: version (None if never modified since its creation)
+    """
+    return get_key_store('dataset:%s:version' % dataset_id)
+
+
+def update_dataset_version(dataset_id):
+    """
+    updates the version of a dataset, in order to invalidate the copies loaded in the processes
+
+    :param dataset_id: id of the dataset
+    :return:
+    """
+    incr_key_store('dataset:%s:version' % dataset_id)
 
 
 def get_dataset_status(dataset_id):
@@ -53,15 +76,41 @@ def get_dataset(dataset_id, include_results=False):
     :param include_results: if need to extract results also
     :return: dataset object
     """
-    dt = make_dataset(get_key_store('dataset:%s' % dataset_id))
-    dt.status = get_key_store('dataset:%s:status' % dataset_id)
+    values = mget_key_store(['dataset:%s%s' % (dataset_id, suffix)
+                             for suffix in __get_dataset_suffixes(include_results)])
+    return __make_dataset_values(values, include_results)
+
+
+def __get_dataset_suffixes(include_results):
+    """
+    suffixes of the keys in store required to load a dataset
+
+    :param include_results: if need to extract results also
+    :return: list of suffixes
+    """
+    suffixes = ['', ':status', ':grapher', ':round_counter']
+    if include_results:
+        suffixes.append(':results')
+    return suffixes
+
+
+def __make_dataset_values(values, include_results):
+    """
+    creates a dataset object from the values of its keys in store
+
+    :param values: values of the keys, in the order of __get_dataset_suffixes
+    :param include_results: if need to extract results also
+    :return: dataset object
+    """
+    dt = make_dataset(values[0])
+    dt.status = values[1]
 
     # add counters and results
-    dt.grapher = get_key_store('dataset:%s:grapher' % dataset_id)
-    dt.round_counter = get_counter_store('dataset:%s:round_counter' % dataset_id)
+    dt.grapher = values[2]
+    dt.round_counter = values[3] if values[3] is not None else 0
 
     if include_results:
-        dt.results = get_key_store('dataset:%s:results' % dataset_id)
+        dt.results = values[4]
 
     return dt
 
@@ -287,11 +336,12 @@ def reset_dataset(dataset_id):
     :return:
     """
     root = get_dataset_folder(dataset_id)
-    for folder in ['predict', 'submit', 'features', 'models', 'graphs']:
+    for folder in ['predict', 'submit', 'features', 'models', 'graphs', 'cache']:
         for f in glob.glob(root + '/' + folder + '/*.*'):
             os.remove(f)
 
     # reset entries
+    update_dataset_version(dataset_id)
     set_key_store('dataset:%s:status' % dataset_id, 'created')
     set_key_store('dataset:%s:grapher' % dataset_id, False)
     set_key_store('dataset:%s:results' % dataset_id, 0)
@@ -301,6 +351,16 @@ def reset_dataset(dataset_id):
         del_key_store('dataset:%s:rounds' % dataset_id)
     if exists_key_store('dataset:%s:search' % dataset_id):
         del_key_store('dataset:%s:search' % dataset_id)
+    if exists_key_store('dataset:%s:seen' % dataset_id):
+        del_key_store('dataset:%s:seen' % dataset_id)
+    if exists_key_store('dataset:%s:pruned' % dataset_id):
+        del_key_store('dataset:%s:pruned' % dataset_id)
+    if exists_key_store('dataset:%s:promoted' % dataset_id):
+        del_key_store('dataset:%s:promoted' % dataset_id)
+    if exists_key_store('dataset:%s:searches' % dataset_id):
+        del_key_store('dataset:%s:searches' % dataset_id)
+    if exists_key_store('dataset:%s:schedule' % dataset_id):
+        del_key_store('dataset:%s:schedule' % dataset_id)
 
     # create graphs
     dt = get_dataset(dataset_id)
@@ -319,16 +379,11 @@ def delete_dataset(dataset_id):
         pass
 
     # removes entries
-    del_key_store('dataset:%s:status' % dataset_id)
-    del_key_store('dataset:%s:results' % dataset_id)
-    del_key_store('dataset:%s:grapher' % dataset_id)
-    lrem_key_store('dataset:list', dataset_id)
-    if exists_key_store('dataset:%s:round_counter' % dataset_id):
-        del_key_store('dataset:%s:round_counter' % dataset_id)
-    if exists_key_store('dataset:%s:rounds' % dataset_id):
-        del_key_store('dataset:%s:rounds' % dataset_id)
-    if exists_key_store('dataset:%s:search' % dataset_id):
-        del_key_store('dataset:%s:search' % dataset_id)
+    with batch_key_store():
+        for suffix in ['status', 'results', 'grapher', 'round_counter', 'rounds', 'search', 'version', 'seen',
+                       'pruned', 'promoted', 'searches', 'schedule']:
+            del_key_store('dataset:%s:%s' % (dataset_id, suffix))
+        lrem_key_store('dataset:list', dataset_id)
 
 
 def get_dataset_sample(dataset_id):
@@ -584,6 +639,7 @@ class DataSet(object):
                               for f in self.features]
                  }
         set_key_store('dataset:%s' % self.dataset_id, store)
+        update_dataset_version(self.dataset_id)
 
     def load(self, load_data, features):
         # reload data from json
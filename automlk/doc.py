@@ -75,6 +75,7 @@ def gener_doc(dataset):
 
         # then for the best rounds
         N_ROUNDS = 5
+        graph_best_rounds(dataset.dataset_id, N_ROUNDS)
         for round_id in list([b['round_id'] for b in best1[:N_ROUNDS]]) + list([b['round_id'] for b in best2[:N_ROUNDS]]):
             round = search[search.round_id == int(round_id)].to_dict(orient='records')[0]
             pipeline = [s for s in round['pipeline'] if s[0] not in ['NO-SCALE', 'PASS']]
@@ -296,6 +296,24 @@ def graph_predict_classification(dataset, round_id, y, y_pred, part='eval'):
         log.error('error in graph_predict_classification with dataset_id %s' % dataset.dataset_id)
 
 
+def create_cnf_matrix(dataset, round_id, y, y_pred, part='eval'):
+    """
+    computes and saves the confusion matrix of a round (the graphs of the round are rendered on demand)
+
+    :param dataset: dataset object
+    :param round_id: id of the round
+    :param y: actual values
+    :param y_pred: predicted values
+    :param part: part of the dataset
+    :return: None
+    """
+    try:
+        cnf_matrix = confusion_matrix(y, np.argmax(y_pred, axis=1))
+        __save_cnf_matrix(dataset.dataset_id, round_id, part, dataset.y_class_names, cnf_matrix)
+    except:
+        log.error('error in create_cnf_matrix with dataset_id %s' % dataset.dataset_id)
+
+
 def graph_histogram_regression(dataset, round_id, y, part='eval'):
     """
     generate the histogram of predictions
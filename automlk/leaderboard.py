@@ -0,0 +1,441 @@
+import json
+import bisect
+import hashlib
+import numpy as np
+from .config import METRIC_NULL
+from .solutions_pp import PP_CATEGORIES
+
+N_CV_SELECT = 5              # number of results with cv before restricting the leaderboard to cv results
+HALVING_RUNGS = 3            # number of budgets in successive halving (the last one is the full cv)
+PRUNE_Z = 1.                 # number of standard errors on the mean score of the folds before pruning a round
+
+
+def config_key(msg):
+    """
+    canonical hash of the configuration of a round: solution, params, pipeline and budget
+
+    :param msg: search or result message
+    :return: hash
+    """
+    config = [msg['solution'], msg['model_params'], msg['pipeline'], msg.get('ensemble_depth', 0), msg['pct'],
+              msg['cv']]
+    return hashlib.sha1(json.dumps(config, sort_keys=True, default=str).encode()).hexdigest()
+
+
+def prune_folds(scores, prune):
+    """
+    checks if a round is to be stopped after a fold: the mean score on the folds evaluated is worse than the threshold
+    of the fold by more than PRUNE_Z standard errors (at least 2 folds evaluated)
+
+    :param scores: scores of the folds evaluated
+    :param prune: thresholds on the mean score per fold (empty = no pruning), see Leaderboard.fold_thresholds
+    :return: True if the round is to be stopped
+    """
+    i = len(scores) - 1
+    if i < 1 or i >= len(prune):
+        return False
+    margin = PRUNE_Z * np.std(scores, ddof=1) / np.sqrt(len(scores))
+    return np.mean(scores) - margin > prune[i]
+
+
+class BestGroups(object):
+    # best result and number of results per group (eg. per model), updated with each new result
+
+    def __init__(self, score, select, group=None, category=None):
+        """
+        :param score: name of the score to minimize (cv_mean or cv_max)
+        :param select: function returning True if the result is to be taken into account
+        :param group: name of the field defining the group
+        :param category: category of pre-processing defining the group (instead of a field)
+        """
+        self.score = score
+        self.select = select
+        self.group = group
+        self.category = category
+        self.groups = {}
+        self.active = False
+        self.best = None
+        self.count = 0
+
+    def add(self, msg):
+        """
+        updates the groups with a new result
+
+        :param msg: result message
+        :return: True if the best results have changed
+        """
+        if not self.select(msg):
+            return False
+        key = self.__key(msg)
+        changed = False
+        if key != '' and not self.active:
+            # the previous results without group are gathered in the empty group
+            self.active = True
+            if self.count > 0:
+                self.groups[''] = [self.best, self.count]
+        if self.active:
+            if key in self.groups:
+                g = self.groups[key]
+                g[1] += 1
+                if msg[self.score] < g[0][self.score]:
+                    g[0] = msg
+                    changed = True
+            else:
+                self.groups[key] = [msg, 1]
+                changed = True
+        if self.best is None or msg[self.score] < self.best[self.score]:
+            self.best = msg
+        self.count += 1
+        return changed
+
+    def records(self):
+        """
+        best result per group, sorted by score, with relative performance and number of searches
+
+        :return: list of records
+        """
+        if len(self.groups) == 0:
+            return []
+        best = sorted(self.groups.values(), key=lambda g: g[0][self.score])
+        s_min, s_max = best[0][0][self.score], best[-1][0][self.score]
+        keys = []
+        for msg, _ in best:
+            keys += [k for k in msg.keys() if k not in keys]
+        records = []
+        for msg, count in best:
+            r = {k: '' if msg.get(k) is None else msg[k] for k in keys}
+            if self.category is not None:
+                # describes the pre-processing of the category
+                r['cat_ref'], r['cat_name'], r['cat_process'], r['cat_params'] = self.__select_cat(msg['pipeline'])
+            if s_max != s_min:
+                r['rel_score'] = abs(100 * (msg[self.score] - s_max) / (s_max - s_min))
+            else:
+                r['rel_score'] = float('nan')
+            r['searches'] = count
+            records.append(r)
+        return records
+
+    def scores(self):
+        """
+        best score per group
+
+        :return: list of (group, score) sorted by score
+        """
+        return sorted([(k, g[0][self.score]) for k, g in self.groups.items()], key=lambda x: x[1])
+
+    def counts(self):
+        """
+        number of results per group
+
+        :return: dict {group: count}
+        """
+        return {k: g[1] for k, g in self.groups.items()}
+
+    def __key(self, msg):
+        # group of the result
+        if self.category is not None:
+            return self.__select_cat(msg['pipeline'])[0]
+        return msg[self.group]
+
+    def __select_cat(self, pipeline):
+        # select the element in the pipeline with the category
+        for p in pipeline:
+            if not isinstance(p, dict) and p[1] == self.category:
+                return p
+        return '', '', '', ''
+
+
+class SuccessiveHalving(object):
+    # rungs of the successive halving: the best configurations of a rung are promoted to the budget of the next rung
+
+    def __init__(self, eta):
+        """
+        :param eta: reduction factor: the best 1/eta of the results of a rung are promoted
+        """
+        self.eta = eta
+        self.rungs = [[] for r in range(HALVING_RUNGS - 1)]
+        self.results = {}
+        self.promoted = set()
+        self.pending = []
+
+    def budget(self, rung):
+        """
+        budget of a rung: percentage of data and cross validation
+
+        :param rung: index of the rung
+        :return: pct, cv
+        """
+        return float(self.eta) ** (rung - HALVING_RUNGS + 1), rung == HALVING_RUNGS - 1
+
+    def add(self, msg):
+        """
+        updates the rungs with a new result, and selects the configurations to be promoted
+
+        :param msg: result message
+        :return:
+        """
+        if msg.get('mode') != 'halving':
+            return
+        if msg['parent'] is not None:
+            self.__promote(msg['parent'])
+        rung = msg['rung']
+        if rung >= len(self.rungs) or msg['cv_mean'] == METRIC_NULL:
+            return
+        self.results[msg['round_id']] = msg
+        bisect.insort(self.rungs[rung], (msg['cv_mean'], msg['round_id']))
+        # asynchronous promotion: any result in the best 1/eta of the rung, as soon as it is there
+        for score, round_id in self.rungs[rung][:len(self.rungs[rung]) // self.eta]:
+            if round_id not in self.promoted:
+                self.__promote(round_id)
+                self.pending.append(self.results[round_id])
+
+    def next_promotion(self):
+        """
+        next configuration to be run on the budget of the next rung
+
+        :return: result message of the configuration in its rung, or None
+        """
+        if len(self.pending) == 0:
+            return None
+        return self.pending.pop(0)
+
+    def dispatched(self, round_id):
+        """
+        marks a configuration as promoted when its job on the next rung has been sent (eg. when the rungs are rebuilt
+        from the results while the job is in progress)
+
+        :param round_id: id of the round of the configuration in its rung
+        :return:
+        """
+        self.__promote(round_id)
+
+    def __promote(self, round_id):
+        # the configuration is promoted once
+        self.promoted.add(round_id)
+        self.pending = [msg for msg in self.pending if msg['round_id'] != round_id]
+
+
+class Leaderboard(object):
+    # best results of the search in a dataset per model and per pre-processing, updated with each new result
+
+    def __init__(self, halving=0):
+        """
+        :param halving: reduction factor of the successive halving (0 = no successive halving)
+        """
+        self.n = 0
+        self.n_cv = 0
+        self.n_pruned = 0
+
+        # rounds with a result (complete or pruned)
+        self.round_ids = set()
+        self.best_score = METRIC_NULL
+        self.best_round = -1
+
+        # best models, with cv only and with all results
+        self.models = {s: BestGroups('cv_mean', lambda m, s=s: m['cv'] in s, group='model_name')
+                       for s in [(True,), (True, False)]}
+
+        # best pre-processing per category
+        self.pp = {}
+        for s, score in [((True,), 'cv_mean'), ((True, False), 'cv_mean'), ((True,), 'cv_max')]:
+            self.pp[(s, score)] = [(c, BestGroups(score, lambda m, s=s: m['cv'] in s and m['level'] == 1,
+                                                  category=c)) for c in PP_CATEGORIES]
+
+        # results of the scan (a few per model), for the scan graph
+        self.scan = []
+
+        # best solutions and models at level 1 for the focus of the search
+        self.solutions = BestGroups('cv_max', lambda m: m['level'] == 1 and m['cv'], group='solution')
+        self.focus = BestGroups('cv_max', lambda m: m['level'] == 1 and m['cv'] and m['cv_max'] != METRIC_NULL,
+                                group='model_name')
+
+        # params and scores of the results with cv per solution, for the sampling of the params
+        self.params = {}
+
+        # round and score per configuration, and configurations sent without result yet
+        self.configs = {}
+        self.in_progress = set()
+
+        # results with cv per level, sorted by score, with the mean score on the first folds, for the pruning
+        self.folds = {}
+
+        # best score per level, and number of results at this level since this score, for the scheduler
+        self.levels = {}
+
+        # rungs of the successive halving
+        self.halving = SuccessiveHalving(halving) if halving > 1 else None
+
+    @property
+    def select_cv(self):
+        """
+        results to take into account: only with cv when there are enough results with cv
+        """
+        return (True,) if self.n_cv > N_CV_SELECT else (True, False)
+
+    def add(self, msg):
+        """
+        updates the leaderboard with a new result
+
+        :param msg: result message
+        :return: set of the best results changed, in the selection of the leaderboard: 'models' and/or 'pp'
+        """
+        select_cv = self.select_cv
+        self.n += 1
+        self.round_ids.add(msg['round_id'])
+        if msg['cv']:
+            self.n_cv += 1
+        if msg['cv'] and msg['cv_mean'] < self.best_score:
+            # only the results with cv (ie. on the full budget in successive halving) are in the final leaderboard
+            self.best_score = msg['cv_mean']
+            self.best_round = msg['round_id']
+
+        changed = set() if self.select_cv == select_cv else {'models', 'pp'}
+        for s, b in self.models.items():
+            if b.add(msg) and s == self.select_cv:
+                changed.add('models')
+        for (s, score), boards in self.pp.items():
+            for c, b in boards:
+                if b.add(msg) and s == self.select_cv and score == 'cv_mean':
+                    changed.add('pp')
+        if msg['mode'] == 'scan':
+            self.scan.append({k: msg[k] for k in ['model_name', 'solution', 'pct', 'cv_mean']})
+        self.solutions.add(msg)
+        self.focus.add(msg)
+        key = config_key(msg)
+        self.configs[key] = (msg['round_id'], msg['cv_mean'])
+        self.in_progress.discard(key)
+        if msg['cv'] and msg['cv_mean'] != METRIC_NULL:
+            self.params.setdefault(msg['solution'], []).append((msg['model_params'], msg['cv_mean']))
+            level = self.levels.setdefault(msg['level'], [METRIC_NULL, 0])
+            if msg['cv_mean'] < level[0]:
+                level[0], level[1] = msg['cv_mean'], 0
+            else:
+                level[1] += 1
+            if len(msg.get('scores_cv', [])) > 0:
+                partial = list(np.cumsum(msg['scores_cv']) / np.arange(1, len(msg['scores_cv']) + 1))
+                bisect.insort(self.folds.setdefault(msg['level'], []), (msg['cv_mean'], msg['round_id'], partial))
+        if self.halving is not None:
+            self.halving.add(msg)
+        return changed
+
+    def add_pruned(self, msg):
+        """
+        updates the leaderboard with the partial result of a round stopped after a few folds: only the history of the
+        params and the configurations are updated, as the round has no predictions
+
+        :param msg: result message, with the scores of the folds evaluated
+        :return:
+        """
+        self.n_pruned += 1
+        self.round_ids.add(msg['round_id'])
+        key = config_key(msg)
+        self.configs[key] = (msg['round_id'], msg['cv_mean'])
+        self.in_progress.discard(key)
+        if msg['level'] in self.levels:
+            # no improvement at this level
+            self.levels[msg['level']][1] += 1
+        # the partial score is not comparable with the scores of the complete results: the params are in the bad results
+        self.params.setdefault(msg['solution'], []).append((msg['model_params'], None))
+
+    def is_new(self, key):
+        """
+        checks if a configuration has not been evaluated nor sent yet
+
+        :param key: hash of the configuration (see config_key)
+        :return: True if the configuration is new
+        """
+        return key not in self.configs and key not in self.in_progress
+
+    def sent(self, key):
+        """
+        records a configuration sent to the workers
+
+        :param key: hash of the configuration (see config_key)
+        :return:
+        """
+        self.in_progress.add(key)
+
+    def fold_thresholds(self, level, k):
+        """
+        thresholds for the pruning of a round: worst mean score on the first folds among the k best results with cv
+
+        :param level: level of the round
+        :param k: rank in the leaderboard to reach
+        :return: list of thresholds per fold (empty if less than k results)
+        """
+        best = self.folds.get(level, [])[:k]
+        if len(best) < k or k < 1:
+            return []
+        return [float(max([partial[i] for _, _, partial in best])) for i in range(min([len(b[2]) for b in best]))]
+
+    def stall(self, level):
+        """
+        number of results with cv at a level since the last improvement of the best score at this level
+
+        :param level: level of the results
+        :return: number of results
+        """
+        return self.levels.get(level, [METRIC_NULL, 0])[1]
+
+    def best_models(self):
+        """
+        best results per model
+
+        :return: list of records
+        """
+        return self.models[self.select_cv].records()
+
+    def best_pp(self, select_cv=None, score='cv_mean'):
+        """
+        best results per pre-processing category
+
+        :param select_cv: results to take into account (default: as the leaderboard)
+        :param score: score to minimize (cv_mean or cv_max)
+        :return: list of (category, records)
+        """
+        if select_cv is None:
+            select_cv = self.select_cv
+        return [(c, b.records()) for c, b in self.pp[(tuple(select_cv), score)] if b.active]
+
+    def search_counts(self):
+        """
+        number of results per model and per pre-processing, as the searches of the best results (see best_models and
+        best_pp), updated with each result while the best results change less often
+
+        :return: dict {'models': {model_name: count}, 'pp': {category: {ref: count}}}
+        """
+        return {'models': self.models[self.select_cv].counts(),
+                'pp': {c: b.counts() for c, b in self.pp[(self.select_cv, 'cv_mean')] if b.active}}
+
+    def list_best_pp(self):
+        """
+        best pre-processing on cv results, with the max score in cv
+
+        :return: list of (ref, category, cv_max)
+        """
+        return [(ref, c, score) for c, b in self.pp[((True,), 'cv_max')] if b.active for ref, score in b.scores()]
+
+    def list_best_models(self):
+        """
+        best solutions at level 1 on cv results, with the max score in cv
+
+        :return: list of (solution, cv_max)
+        """
+        return self.solutions.scores()
+
+    def history(self, solution):
+        """
+        params and scores of the results with cv of a solution
+
+        :param solution: ref of the solution
+        :return: list of (params, cv_mean), with cv_mean None for the rounds pruned
+        """
+        return self.params.get(solution, [])
+
+    def focus_scores(self):
+        """
+        best max score in cv per model at level 1
+
+        :return: sorted list of scores
+        """
+        return [score for _, score in self.focus.scores()]
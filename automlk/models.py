@@ -119,7 +119,7 @@ class ModelNN(Model):
         if not self.model_created:
             self.__create_model(len(X_train.columns))
         keras_compile_model(self.model, self.params, self.problem_type)
-        self.model.fit(X_train.as_matrix(), self.prepare_y(y_train), epochs=self.num_rounds, batch_size=self.params['batch_size'],
+        self.model.fit(X_train.values, self.prepare_y(y_train), epochs=self.num_rounds, batch_size=self.params['batch_size'],
                        validation_split=0.,
                        verbose=0)
 
@@ -132,13 +132,13 @@ class ModelNN(Model):
         i_best_score = 0
         self.num_rounds = 0
         for i in range(MAX_ROUNDS):
-            self.model.fit(X_train.as_matrix(), self.prepare_y(y_train), epochs=1, batch_size=self.params['batch_size'],
+            self.model.fit(X_train.values, self.prepare_y(y_train), epochs=1, batch_size=self.params['batch_size'],
                            validation_split=0.,
                            verbose=0)
             if self.problem_type == 'regression':
-                y_pred = self.model.predict(X_eval.as_matrix())
+                y_pred = self.model.predict(X_eval.values)
             else:
-                y_pred = self.model.predict_proba(X_eval.as_matrix())
+                y_pred = self.model.predict_proba(X_eval.values)
             score = self.dataset.evaluate_metric(y_eval, y_pred)
             if score < best_score:
                 self.num_rounds = i
@@ -156,9 +156,9 @@ class ModelNN(Model):
     def predict_proba(self, X):
         # prediction with specific case of binary and classification
         if self.y_n_classes == 2:
-            return binary_proba(self.model.predict(X.as_matrix()))
+            return binary_proba(self.model.predict(X.values))
         else:
-            return self.model.predict_proba(X.as_matrix())
+            return self.model.predict_proba(X.values)
 
     def prepare_y(self, y):
         # generate y in one hot encoding if classification
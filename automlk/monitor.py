@@ -18,7 +18,7 @@ def get_heart_beeps(module):
     try:
         # get list and values
         l = smembers_key_store('monitor:%s' % module)
-        l_hb = [get_key_store('monitor:%s:%s' % (module, id)) for id in l]
+        l_hb = [h for h in mget_key_store(['monitor:%s:%s' % (module, id) for id in l]) if h is not None]
 
         # filter on heart beeps < 12h
         return [h for h in l_hb if
@@ -27,6 +27,26 @@ def get_heart_beeps(module):
         return []
 
 
+def get_workers_load(delay):
+    """
+    counts the idle and busy workers from their last heart beeps (a worker sends a heart beep at least every 10 seconds,
+    waiting for a job or not)
+
+    :param delay: maximum age in seconds of the heart beep of a worker still running
+    :return: number of idle workers, number of busy workers
+    """
+    idle, busy = 0, 0
+    for h in get_heart_beeps('worker'):
+        if (datetime.datetime.now() - datetime.datetime(**h['time'])) >= datetime.timedelta(seconds=delay):
+            # worker stopped or dead
+            continue
+        if isinstance(h['msg'], dict) and 'dataset_id' in h['msg']:
+            busy += 1
+        else:
+            idle += 1
+    return idle, busy
+
+
 def heart_beep(module, msg, index=1, gpu=False):
     """
     send heart beep as module
@@ -0,0 +1,98 @@
+import os
+import json
+import pickle
+import hashlib
+import logging
+from .context import get_dataset_folder, get_config
+
+log = logging.getLogger(__name__)
+
+
+def get_pp_cache(dataset_id, version, pipeline):
+    """
+    retrieves the result of a pre-processing pipeline from the cache of the dataset
+
+    :param dataset_id: id of the dataset
+    :param version: version of the dataset
+    :param pipeline: pre-processing steps (ref, category, name, params)
+    :return: (feature names, X_train, X_test, X, X_submit, fitted transformers) or None if not in the cache
+    """
+    if get_config()['pp_cache'] <= 0:
+        return None
+    filename = __cache_file(dataset_id, version, pipeline)
+    try:
+        with open(filename, 'rb') as f:
+            value = pickle.load(f)
+        # the modification time is the last use of the result, for the eviction
+        os.utime(filename)
+        return value
+    except (OSError, EOFError, pickle.UnpicklingError):
+        return None
+
+
+def set_pp_cache(dataset_id, version, pipeline, value):
+    """
+    stores the result of a pre-processing pipeline in the cache of the dataset, and evicts the least recently used
+    results above the size of the cache
+
+    :param dataset_id: id of the dataset
+    :param version: version of the dataset
+    :param pipeline: pre-processing steps (ref, category, name, params)
+    :param value: (feature names, X_train, X_test, X, X_submit, fitted transformers)
+    :return:
+    """
+    size = get_config()['pp_cache'] * 1048576
+    if size <= 0:
+        return
+    filename = __cache_file(dataset_id, version, pipeline)
+    os.makedirs(os.path.dirname(filename), exist_ok=True)
+    tmp = filename + '.%d.tmp' % os.getpid()
+    with open(tmp, 'wb') as f:
+        pickle.dump(value, f)
+    os.replace(tmp, filename)
+    __evict(os.path.dirname(filename), size)
+
+
+def pp_cache_key(version, pipeline):
+    """
+    canonical hash of a pre-processing pipeline: refs, categories and params of the steps (sampling excluded)
+
+    :param version: version of the dataset
+    :param pipeline: pre-processing steps (ref, category, name, params)
+    :return: hash
+    """
+    steps = [(ref, category, params) for ref, category, name, params in pipeline if category != 'sampling']
+    return hashlib.sha1(json.dumps([version, steps], sort_keys=True, default=str).encode()).hexdigest()
+
+
+def __cache_file(dataset_id, version, pipeline):
+    # file of the result of the pipeline
+    return get_dataset_folder(dataset_id) + '/cache/%s.pkl' % pp_cache_key(version, pipeline)
+
+
+def __evict(folder, size):
+    """
+    removes the least recently used results of the cache above the size
+
+    :param folder: folder of the cache
+    :param size: maximum size in bytes
+    :return:
+    """
+    files = []
+    for f in os.listdir(folder):
+        if f.endswith('.pkl'):
+            try:
+                st = os.stat(folder + '/' + f)
+                files.append((st.st_mtime, st.st_size, f))
+            except OSError:
+                pass
+    total = sum([s for _, s, _ in files])
+    for _, s, f in sorted(files):
+        if total <= size:
+            break
+        try:
+            os.remove(folder + '/' + f)
+            log.info('pre-processing cache: removed %s' % f)
+        except OSError:
+            pass
+        total -= s
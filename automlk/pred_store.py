@@ -0,0 +1,160 @@
+import os
+import pickle
+import logging
+import numpy as np
+from .context import get_dataset_folder
+
+log = logging.getLogger(__name__)
+
+try:
+    import fcntl
+    import_fcntl = True
+except:
+    import_fcntl = False
+
+PRED_PARTS = ['eval', 'test', 'submit']
+INDEX_WIDTH = 4              # round id and number of predictions on eval, test and submit set
+
+# stores opened in this process: dataset_id -> (signature of the index, metadata, rounds, memory maps)
+__stores = {}
+
+
+def set_pred_eval_test(dataset_id, round_id, y_pred_eval, y_pred_test, y_pred_submit, n_rows):
+    """
+    saves the predictions of a round in the prediction store of the dataset
+
+    the store is a float32 matrix (rounds x rows x classes) per set, with an index of the rounds: the predictions are
+    appended under a lock, and saved as a pickle of the round when they do not fit the format of the store
+
+    :param dataset_id: id of the dataset
+    :param round_id: id of the round
+    :param y_pred_eval: predictions on the eval set
+    :param y_pred_test: predictions on the test set
+    :param y_pred_submit: predictions on the submit set
+    :param n_rows: number of rows of the eval, test and submit sets
+    :return:
+    """
+    folder = get_dataset_folder(dataset_id) + '/predict'
+    preds = [y_pred_eval, y_pred_test, y_pred_submit]
+    if import_fcntl:
+        with open(folder + '/store.lock', 'a') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                if __append(folder, round_id, preds, n_rows):
+                    return
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+    pickle.dump(preds, open(folder + '/%s.pkl' % round_id, 'wb'))
+
+
+def get_pred_rounds(dataset_id, round_ids):
+    """
+    predictions of a list of rounds, read as slices of the prediction store (or in the pickle of the round)
+
+    :param dataset_id: id of the dataset
+    :param round_ids: list of round ids
+    :return: list of predictions for eval set, test and submit set, per round
+    """
+    folder = get_dataset_folder(dataset_id) + '/predict'
+    store = __open_store(dataset_id, folder)
+    preds = []
+    for round_id in round_ids:
+        if store is not None and int(round_id) in store[1]:
+            preds.append(__read(store, int(round_id)))
+        else:
+            preds.append(pickle.load(open(folder + '/%s.pkl' % round_id, 'rb')))
+    return preds
+
+
+def __append(folder, round_id, preds, n_rows):
+    """
+    appends the predictions of a round to the store (the lock of the store is acquired)
+
+    :param folder: folder of the predictions
+    :param round_id: id of the round
+    :param preds: predictions on eval, test and submit set
+    :param n_rows: number of rows of the eval, test and submit sets
+    :return: True if the predictions are stored, False if they do not fit the format of the store
+    """
+    if os.path.exists(folder + '/store.pkl'):
+        meta = pickle.load(open(folder + '/store.pkl', 'rb'))
+    else:
+        # the format is defined by the first round
+        shape = np.shape(preds[0])
+        meta = {'rows': list(n_rows), 'ndim': len(shape), 'classes': shape[1] if len(shape) == 2 else 1}
+        if meta['ndim'] not in [1, 2]:
+            return False
+        pickle.dump(meta, open(folder + '/store.pkl', 'wb'))
+
+    lengths = []
+    for pred, rows in zip(preds, meta['rows']):
+        if pred is None:
+            lengths.append(-1)
+        elif len(pred) == 0:
+            lengths.append(0)
+        elif len(np.shape(pred)) != meta['ndim'] or len(pred) > rows or \
+                (meta['ndim'] == 2 and np.shape(pred)[1] != meta['classes']):
+            return False
+        else:
+            lengths.append(len(pred))
+
+    # the index is written last: the predictions of a round are visible only when completely written
+    filename = folder + '/store_index.i8'
+    k = os.path.getsize(filename) // (8 * INDEX_WIDTH) if os.path.exists(filename) else 0
+    for part, pred, rows, n in zip(PRED_PARTS, preds, meta['rows'], lengths):
+        if rows > 0:
+            values = np.full((rows, meta['classes']), np.nan, dtype=np.float32)
+            if n > 0:
+                values[:n] = np.reshape(pred, (n, meta['classes']))
+            part_file = folder + '/store_%s.f32' % part
+            with open(part_file, 'r+b' if os.path.exists(part_file) else 'wb') as f:
+                f.seek(k * values.nbytes)
+                f.write(values.tobytes())
+    with open(filename, 'ab') as f:
+        f.write(np.array([round_id] + lengths, dtype=np.int64).tobytes())
+    return True
+
+
+def __open_store(dataset_id, folder):
+    """
+    opens the prediction store of the dataset, as memory maps (kept while no round is added)
+
+    :param dataset_id: id of the dataset
+    :param folder: folder of the predictions
+    :return: (metadata, rounds, memory maps) or None if there is no store
+    """
+    try:
+        st = os.stat(folder + '/store_index.i8')
+    except OSError:
+        return None
+    signature = (st.st_ino, st.st_size, st.st_mtime)
+    if dataset_id in __stores and __stores[dataset_id][0] == signature:
+        return __stores[dataset_id][1:]
+
+    meta = pickle.load(open(folder + '/store.pkl', 'rb'))
+    index = np.fromfile(folder + '/store_index.i8', dtype=np.int64)
+    index = index[:len(index) // INDEX_WIDTH * INDEX_WIDTH].reshape(-1, INDEX_WIDTH)
+    n = len(index)
+    maps = [np.memmap(folder + '/store_%s.f32' % part, dtype=np.float32, mode='r', shape=(n, rows, meta['classes']))
+            if rows > 0 and n > 0 else None for part, rows in zip(PRED_PARTS, meta['rows'])]
+    # the last predictions of a round are the valid ones
+    rounds = {int(r[0]): (k, [int(x) for x in r[1:]]) for k, r in enumerate(index)}
+    __stores[dataset_id] = (signature, meta, rounds, maps)
+    return meta, rounds, maps
+
+
+def __read(store, round_id):
+    # predictions of a round in the store
+    meta, rounds, maps = store
+    k, lengths = rounds[round_id]
+    preds = []
+    for m, n in zip(maps, lengths):
+        if n < 0:
+            preds.append(None)
+        elif n == 0:
+            preds.append([])
+        elif meta['ndim'] == 1:
+            preds.append(m[k, :n, 0])
+        else:
+            preds.append(m[k, :n])
+    return preds
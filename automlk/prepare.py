@@ -1,17 +1,28 @@
+import copy
 import pickle
 from sklearn.model_selection import train_test_split, KFold, StratifiedKFold
 from .dataset import *
 from .specific import *
 
 
+EVAL_SET_FRAMES = ['X', 'X_train', 'X_test', 'X_submit']
+EVAL_SET_ARRAYS = ['y', 'y_train', 'y_test']
+
+
 def get_eval_sets(dataset_id):
     """
     get the complete eval set
 
+    the columns of the data are memory-mapped read-only from the columnar eval set, and shared between the processes
+    of the machine (the columnar eval set is created from the pickle for the datasets prepared with previous versions)
+
     :param dataset_id: id of the dataset
     :return: eval set (XySet object)
     """
-    return pickle.load(open(get_dataset_folder(dataset_id) + '/data/eval_set.pkl', 'rb'))
+    folder = get_dataset_folder(dataset_id) + '/data/eval_set'
+    if not os.path.exists(folder + '/meta.pkl'):
+        __save_eval_set(folder, pickle.load(open(get_dataset_folder(dataset_id) + '/data/eval_set.pkl', 'rb')))
+    return __load_eval_set(folder)
 
 
 def get_idx_train_test(dataset_id):
@@ -46,6 +57,8 @@ def prepare_dataset_sets(dt):
     # then store all these results in a pickle store
     ds = XySet(X, y, X_train, y_train, X_test, y_test, X_submit, id_submit, cv_folds, y_eval_list, y_eval, idx_eval, idx_eval0)
     pickle.dump(ds, open(get_dataset_folder(dt.dataset_id) + '/data/eval_set.pkl', 'wb'))
+    __save_eval_set(get_dataset_folder(dt.dataset_id) + '/data/eval_set', ds)
+    update_dataset_version(dt.dataset_id)
 
     # and keep index of split for future use (eg match predictions with initial file)
     pickle.dump([i_train, i_test], open(get_dataset_folder(dt.dataset_id) + '/data/i_train_test.pkl', 'wb'))
@@ -172,3 +185,119 @@ def __prepare_y(dataset, y, y_train, y_test):
         y_train = np.array([map_y[str(x)] if str(x) in map_y else 0 for x in y_train])
         y_test = np.array([map_y[str(x)] if str(x) in map_y else 0 for x in y_test])
     return y, y_train, y_test
+
+
+def __save_eval_set(folder, ds):
+    """
+    stores the eval set in a columnar layout: a npy file per numeric column (memory-mappable) and codes with
+    a dictionary for the other columns
+
+    the files are replaced and not rewritten, in order not to modify the files mapped by other processes
+
+    :param folder: folder of the eval set
+    :param ds: eval set (XySet object)
+    :return:
+    """
+    os.makedirs(folder, exist_ok=True)
+    meta = {'frames': {}, 'arrays': {}, 'objects': {}}
+    for name, value in ds.__dict__.items():
+        if name in EVAL_SET_FRAMES and isinstance(value, pd.DataFrame):
+            columns = []
+            for i in range(len(value.columns)):
+                x = value.iloc[:, i]
+                filename = '%s_%d.npy' % (name, i)
+                if isinstance(x.dtype, np.dtype) and x.dtype.kind in 'biufcmM':
+                    __save_array(folder, filename, x.values)
+                    columns.append((filename, None, None))
+                else:
+                    codes, uniques = pd.factorize(x)
+                    __save_array(folder, filename, codes.astype(__codes_dtype(len(uniques))))
+                    columns.append((filename, list(uniques), str(x.dtype)))
+            if isinstance(value.index, pd.RangeIndex):
+                index = value.index
+            else:
+                index = '%s_index.npy' % name
+                __save_array(folder, index, value.index.values)
+            meta['frames'][name] = (value.columns, columns, index)
+        elif name in EVAL_SET_ARRAYS and isinstance(value, np.ndarray) and value.dtype.kind in 'biufcmM':
+            __save_array(folder, name + '.npy', value)
+            meta['arrays'][name] = name + '.npy'
+        else:
+            meta['objects'][name] = value
+
+    # the description of the eval set is saved last
+    tmp = folder + '/meta.pkl.%d.tmp' % os.getpid()
+    pickle.dump(meta, open(tmp, 'wb'))
+    os.replace(tmp, folder + '/meta.pkl')
+
+
+def __save_array(folder, filename, x):
+    # saves an array in a new file replacing the previous one
+    tmp = folder + '/%s.%d.tmp' % (filename, os.getpid())
+    with open(tmp, 'wb') as f:
+        np.save(f, np.asarray(x))
+    os.replace(tmp, folder + '/' + filename)
+
+
+def __codes_dtype(n):
+    # smallest integer type of the codes of n values, as in pandas (the codes are then used without copy)
+    for dtype in [np.int8, np.int16, np.int32]:
+        if n < np.iinfo(dtype).max:
+            return dtype
+    return np.int64
+
+
+def __load_eval_set(folder):
+    """
+    loads the eval set from the columnar layout, with the numeric columns and arrays memory-mapped read-only
+
+    the other columns are categorical columns on the memory-mapped codes: they are listed in the attribute coded_cols
+    of the eval set, to be decoded in their original type when the data are copied for the pre-processing (see
+    copy_eval_set)
+
+    :param folder: folder of the eval set
+    :return: eval set (XySet object)
+    """
+    meta = pickle.load(open(folder + '/meta.pkl', 'rb'))
+    values = dict(meta['objects'])
+    values['coded_cols'] = {}
+    for name, filename in meta['arrays'].items():
+        values[name] = np.load(folder + '/' + filename, mmap_mode='r')
+    for name, (names, columns, index) in meta['frames'].items():
+        if not isinstance(index, pd.Index):
+            index = pd.Index(np.load(folder + '/' + index, mmap_mode='r'))
+        data = {}
+        for i, (filename, uniques, dtype) in enumerate(columns):
+            x = np.load(folder + '/' + filename, mmap_mode='r')
+            if uniques is not None:
+                # the code -1 is a missing value
+                x = pd.Series(pd.Categorical.from_codes(x, pd.Index(uniques, dtype=object)), index=index, copy=False)
+                if dtype != 'category':
+                    values['coded_cols'].setdefault(name, []).append((i, dtype))
+            data[i] = x
+        df = pd.DataFrame(data, index=index, copy=False)
+        df.columns = names
+        values[name] = df
+    ds = XySet(*[None] * 13)
+    ds.__dict__.update(values)
+    return ds
+
+
+def copy_eval_set(ds):
+    """
+    copy of the eval set for the pre-processing: the data frames are new objects sharing the numeric columns of the eval
+    set (replaced and not modified by the pre-processing), and the coded columns are decoded in the copy only
+
+    :param ds: eval set
+    :return: copy of the eval set
+    """
+    ds = copy.copy(ds)
+    coded_cols = getattr(ds, 'coded_cols', {})
+    for name in EVAL_SET_FRAMES:
+        df = getattr(ds, name, None)
+        if isinstance(df, pd.DataFrame):
+            df = df.copy(deep=False)
+            for i, dtype in coded_cols.get(name, []):
+                df.isetitem(i, df.iloc[:, i].astype(dtype))
+            setattr(ds, name, df)
+    return ds
@@ -1,10 +1,22 @@
+import os
+import gzip
 import pickle
 import json
+import threading
 import pandas as pd
 import numpy as np
-from .store import exists_key_store, get_key_store
+from .store import exists_key_store, get_key_store, mget_key_store
 from .dataset import get_dataset_list, get_dataset_folder, get_dataset
 from .prepare import get_idx_train_test, get_eval_sets
+from .pred_store import get_pred_rounds
+from .graphs import graph_histogram_regression, graph_histogram_classification, graph_predict_regression, \
+    graph_predict_classification
+
+ROUND_GRAPHS = [('predict', 'eval'), ('predict', 'test'), ('hist', 'eval'), ('hist', 'test')]
+N_BEST_GRAPHS = 5            # number of best rounds per level with graphs rendered in advance
+
+# the graphs of the rounds are rendered one at a time (matplotlib is not thread safe)
+__graphs_lock = threading.Lock()
 
 
 def get_importance(dataset_id, round_id):
@@ -29,7 +41,50 @@ def get_pred_eval_test(dataset_id, round_id):
     :param round_id: id of the round
     :return: list of predictions for eval set, test and submit set
     """
-    return pickle.load(open(get_dataset_folder(dataset_id) + '/predict/%s.pkl' % round_id, 'rb'))
+    return get_pred_rounds(dataset_id, [round_id])[0]
+
+
+def get_round_model(dataset_id, round_id):
+    """
+    fitted model of a round, with its pipelines
+
+    :param dataset_id: id of the dataset
+    :param round_id: id of the round
+    :return: pipeline of pre-processing steps, pipeline with the model, model (None if the model is not saved)
+    """
+    filename = get_dataset_folder(dataset_id) + '/models/%s_model_set.pkl' % round_id
+    if os.path.exists(filename):
+        with open(filename, 'rb') as f:
+            return pickle.load(f)
+    if os.path.exists(filename + '.gz'):
+        with gzip.open(filename + '.gz', 'rb') as f:
+            return pickle.load(f)
+    # format of the previous versions: one file per object
+    folder = get_dataset_folder(dataset_id) + '/models/'
+    if os.path.exists(folder + '%s_model.pkl' % round_id):
+        return tuple([pickle.load(open(folder + '%s_%s.pkl' % (round_id, name), 'rb'))
+                      for name in ['pipe_transform', 'pipe_model', 'model']])
+    return None, None, None
+
+
+def create_model_file(dataset_id, round_id, name):
+    """
+    creates the pickle file of the model or pipeline of a round, to be downloaded
+
+    :param dataset_id: id of the dataset
+    :param round_id: id of the round
+    :param name: object to be saved (pipe_transform, pipe_model or model)
+    :return: file name, or None if the model of the round has not been saved (see option model_rank)
+    """
+    filename = get_dataset_folder(dataset_id) + '/models/%s_%s.pkl' % (round_id, name)
+    if not os.path.exists(filename):
+        pipe_transform, pipe_model, model = get_round_model(dataset_id, round_id)
+        value = {'pipe_transform': pipe_transform, 'pipe_model': pipe_model, 'model': model}[name]
+        if value is None:
+            return None
+        with open(filename, 'wb') as f:
+            pickle.dump(value, f)
+    return filename
 
 
 def print_value(x):
@@ -56,21 +111,26 @@ def get_home_best():
 
 
 def get_best_models(dataset_id):
-    # get the best results per model
-    key = 'dataset:%s:best' % dataset_id
-    if exists_key_store(key):
-        return get_key_store(key)
-    else:
+    # get the best results per model, with the current numbers of searches (updated apart from the best results)
+    best, counts = mget_key_store(['dataset:%s:best' % dataset_id, 'dataset:%s:searches' % dataset_id])
+    if best is None:
         return []
+    if counts is not None:
+        for r in best:
+            r['searches'] = counts['models'].get(r['model_name'], r['searches'])
+    return best
 
 
 def get_best_pp(dataset_id):
-        # get the best results per pre-processing
-        key = 'dataset:%s:best_pp' % dataset_id
-        if exists_key_store(key):
-            return get_key_store(key)
-        else:
-            return []
+    # get the best results per pre-processing, with the current numbers of searches (see get_best_models)
+    best_pp, counts = mget_key_store(['dataset:%s:best_pp' % dataset_id, 'dataset:%s:searches' % dataset_id])
+    if best_pp is None:
+        return []
+    if counts is not None:
+        for c, records in best_pp:
+            for r in records:
+                r['searches'] = counts['pp'].get(c, {}).get(r['cat_ref'], r['searches'])
+    return best_pp
 
 
 def get_best_details(df, model_name):
@@ -260,3 +320,72 @@ def create_predict_file(dataset_id, round_id):
     return filename
 
 
+def get_round_graph(dataset_id, round_id, graph_type, dark=False):
+    """
+    file of a graph of a round, rendered from the predictions of the round the first time it is requested
+
+    :param dataset_id: id of the dataset
+    :param round_id: id of the round
+    :param graph_type: type of graph (predict_eval, predict_norm_eval, hist_eval, ... or with test)
+    :param dark: dark theme
+    :return: filename of the graph
+    """
+    filename = get_dataset_folder(dataset_id) + '/%s/%s_%s.png' % ('graphs_dark' if dark else 'graphs', graph_type,
+                                                                  round_id)
+    if not os.path.exists(filename):
+        part = graph_type.split('_')[-1]
+        kind = graph_type.split('_')[0]
+        if (kind, part) in ROUND_GRAPHS:
+            graph_round(get_dataset(dataset_id), round_id, [(kind, part)])
+    return filename
+
+
+def graph_best_rounds(dataset_id, n=N_BEST_GRAPHS):
+    """
+    renders in advance the graphs of the best rounds of the leaderboard, at level 1 and level 2
+
+    :param dataset_id: id of the dataset
+    :param n: number of rounds per level
+    :return:
+    """
+    dataset = get_dataset(dataset_id)
+    best = get_best_models(dataset_id)
+    for level in [1, 2]:
+        for b in [b for b in best if b['level'] == level][:n]:
+            graph_round(dataset, b['round_id'])
+
+
+def graph_round(dataset, round_id, graphs=ROUND_GRAPHS):
+    """
+    renders the graphs of a round from its predictions and the actuals of the eval set, when not already rendered
+
+    :param dataset: dataset object
+    :param round_id: id of the round
+    :param graphs: list of graphs to render, as (kind, part)
+    :return:
+    """
+    folder = get_dataset_folder(dataset.dataset_id)
+    with __graphs_lock:
+        # the graphs are rendered in both themes: missing in one of the folders, they are rendered again
+        graphs = [(kind, part) for kind, part in graphs
+                  if not all([os.path.exists(folder + '/%s/%s_%s_%s.png' % (theme, kind, part, round_id))
+                              for theme in ['graphs', 'graphs_dark']])]
+        if len(graphs) == 0:
+            return
+        ds = get_eval_sets(dataset.dataset_id)
+        y_pred_eval, y_pred_test, y_pred_submit = get_pred_eval_test(dataset.dataset_id, round_id)
+        y_eval = ds.y_train
+        if len(y_pred_eval) != len(y_eval):
+            # round without cross validation: the predictions are on the eval part of the first fold
+            y_eval = y_eval[ds.cv_folds[0][1]]
+        actuals = {'eval': (y_eval, y_pred_eval), 'test': (ds.y_test, y_pred_test)}
+        for kind, part in graphs:
+            y, y_pred = actuals[part]
+            if kind == 'predict' and dataset.problem_type == 'regression':
+                graph_predict_regression(dataset, round_id, y, y_pred, part)
+            elif kind == 'predict':
+                graph_predict_classification(dataset, round_id, y, y_pred, part)
+            elif dataset.problem_type == 'regression':
+                graph_histogram_regression(dataset, round_id, y_pred, part)
+            else:
+                graph_histogram_classification(dataset, round_id, y_pred, part)
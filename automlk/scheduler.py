@@ -0,0 +1,65 @@
+ENSEMBLE_START = 100         # default number of rounds before the first round at level 2
+ENSEMBLE_RATIO = 2           # default: one round at level 2 every ENSEMBLE_RATIO rounds
+ADAPTIVE_WINDOW = 20         # number of results at level 2 without improvement before reducing the ensembles
+ADAPTIVE_STEPS = 3           # number max of times the ratio is doubled (ie. ratio up to 8 times the ratio)
+
+
+def get_round_ids(round_id, start=ENSEMBLE_START, ratio=ENSEMBLE_RATIO, origin=(0, 0, 0)):
+    """
+    level of a round and index of the round in its level: from the round start, the rounds multiple of ratio are at
+    level 2, and the other ones at level 1
+
+    when the ratio changes during the search, the ratio applies from the round of the change (origin), after the
+    rounds already counted at each level with the previous ratios (see get_round_origin)
+
+    :param round_id: id of the round
+    :param start: id of the first round where the ensembles are possible
+    :param ratio: one round at level 2 every ratio rounds (0 = no ensembles)
+    :param origin: first round with this ratio, numbers of rounds at level 1 and 2 before this round
+    :return: level, index of the round at level 1, index of the round at level 2 (-1 if no round at this level yet)
+    """
+    r0, n_l1, n_l2 = origin
+    first = max(start, r0)
+    if round_id < first or ratio < 1:
+        return 1, n_l1 + round_id - r0, n_l2 - 1
+    # number of rounds at level 2 from the origin up to this round (included), ie multiples of ratio in
+    # [first, round_id]
+    m = round_id // ratio - (first - 1) // ratio
+    n_l1, n_l2 = n_l1 + round_id - r0 + 1 - m, n_l2 + m
+    if round_id % ratio == 0:
+        return 2, n_l1 - 1, n_l2 - 1
+    return 1, n_l1 - 1, n_l2 - 1
+
+
+def get_round_origin(round_id, start, ratio, origin=(0, 0, 0)):
+    """
+    origin of a new ratio applied from a round: numbers of rounds at level 1 and 2 before this round, with the
+    previous ratio
+
+    :param round_id: id of the first round with the new ratio
+    :param start: id of the first round where the ensembles are possible
+    :param ratio: previous ratio
+    :param origin: origin of the previous ratio
+    :return: origin of the new ratio (see get_round_ids)
+    """
+    if round_id <= origin[0]:
+        return origin
+    level, i_l1, i_l2 = get_round_ids(round_id - 1, start, ratio, origin)
+    return round_id, i_l1 + 1, i_l2 + 1
+
+
+def get_ensemble_ratio(ratio, policy, stall):
+    """
+    ratio between the rounds at level 1 and 2 according to the policy of the scheduler
+
+    with the policy 'fixed', the ratio is constant; with the policy 'adaptive', the ratio is doubled each time the
+    ensembles have not improved their best score during ADAPTIVE_WINDOW results, and restored with an improvement
+
+    :param ratio: ratio in the config
+    :param policy: fixed or adaptive
+    :param stall: number of results at level 2 since the last improvement of their best score
+    :return: ratio to apply
+    """
+    if policy != 'adaptive' or ratio < 1:
+        return ratio
+    return ratio * 2 ** min(stall // ADAPTIVE_WINDOW, ADAPTIVE_STEPS)
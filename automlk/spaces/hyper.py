@@ -1,6 +1,14 @@
+import math
 import random
+import numpy as np
 from abc import ABCMeta, abstractmethod
 
+TPE_STARTUP = 10             # number of results of the solution before sampling with the estimators
+TPE_GAMMA = 0.25             # number of good results = gamma * square root of the number of results
+TPE_GOOD_MAX = 25            # maximum number of good results
+TPE_CANDIDATES = 24          # number of candidates sampled in the density of the good results
+TPE_PRIOR = 1.               # weight of the prior distribution of the space in the densities
+
 
 class AbstractHyper():
     """
@@ -49,12 +57,14 @@ class HyperRangeInt(AbstractHyper):
 
     def __init__(self, start, end, step=1):
         self.vals = [x for x in range(start, end, step)]
+        self.index = {x: i for i, x in enumerate(self.vals)}
 
 
 class HyperRangeFloat(AbstractHyper):
     # class for choices in a float range (start, end, number of values)
     def __init__(self, start, end, n=100):
         self.vals = [start + (end - start) * i / n for i in range(n)]
+        self.index = {x: i for i, x in enumerate(self.vals)}
 
 
 def eval_space_key(sk):
@@ -85,3 +95,125 @@ def get_random_params(space):
         for key in space.keys():
             param[key] = eval_space_key(space[key])
         return param
+
+
+def get_tpe_params(space, history):
+    """
+    generate a parameter list from space definition with a tree-structured parzen estimator (tpe)
+
+    the previous results are split in good results (the best ones) and bad results: in each node of the space, the
+    value is the candidate with the best ratio of the densities of good and bad results, among candidates sampled in the
+    density of good results; the results are then followed in the branch of the value (conditional spaces)
+
+    :param space: space definition (dictionary of hyper parameters, or list of parameter lists)
+    :param history: list of (params, score) of the previous results with this space, where the lowest score is the best
+    (score None for a result always in the bad results, eg. a round stopped after a few folds)
+    :return: parameter list
+    """
+    if len(history) < TPE_STARTUP:
+        return get_random_params(space)
+    n_good = min(TPE_GOOD_MAX, int(math.ceil(TPE_GAMMA * math.sqrt(len(history)))))
+    scored = sorted([x for x in history if x[1] is not None], key=lambda x: x[1])
+    good = [p for p, s in scored[:n_good]]
+    bad = [p for p, s in scored[n_good:]] + [p for p, s in history if s is None]
+    if isinstance(space, list):
+        return __tpe_value(space, good, bad)
+    param = {}
+    for key in space.keys():
+        if isinstance(space[key], AbstractHyper):
+            param[key] = __tpe_value(space[key], [p[key] for p in good if key in p], [p[key] for p in bad if key in p])
+        else:
+            param[key] = space[key]
+    return param
+
+
+def __tpe_value(node, good, bad):
+    """
+    value of a node of the space, from the values of the good and bad results
+
+    :param node: node of the space (hyper object, list of values or value)
+    :param good: values in the good results
+    :param bad: values in the bad results
+    :return: value
+    """
+    if isinstance(node, (HyperRangeInt, HyperRangeFloat)):
+        return __tpe_range(node, good, bad)
+    elif isinstance(node, HyperWeights):
+        children, prior, match = node.vals, node.weights, __contains
+    elif isinstance(node, AbstractHyper):
+        children, prior, match = node.vals, [1] * len(node.vals), __contains
+    elif isinstance(node, list):
+        # choice within a list
+        children, prior, match = node, [1] * len(node), __same
+    else:
+        return node
+
+    l = __tpe_density([[v for v in good if match(c, v)] for c in children], prior)
+    g = __tpe_density([[v for v in bad if match(c, v)] for c in children], prior)
+    i = max(random.choices(range(len(children)), weights=l, k=TPE_CANDIDATES), key=lambda i: l[i] / g[i])
+    child = children[i]
+    if isinstance(node, list):
+        return child
+    # the results are followed in the branch
+    return __tpe_value(child, [v for v in good if match(child, v)], [v for v in bad if match(child, v)])
+
+
+def __tpe_density(observed, prior):
+    # density of a choice: prior of the space and number of results per value
+    total = sum(prior)
+    d = [TPE_PRIOR * w / total + len(obs) for obs, w in zip(observed, prior)]
+    return [x / sum(d) for x in d]
+
+
+def __tpe_range(node, good, bad):
+    # value in a range: parzen estimators on the index of the values in the range
+    n = len(node.vals)
+    l = __parzen([node.index[v] for v in good if __in_range(node, v)], n)
+    g = __parzen([node.index[v] for v in bad if __in_range(node, v)], n)
+    i = max(random.choices(range(n), weights=l, k=TPE_CANDIDATES), key=lambda i: l[i] / g[i])
+    return node.vals[i]
+
+
+def __parzen(observed, n):
+    """
+    parzen estimator on the indexes of a range: uniform prior and a gaussian kernel per observation, with a bandwidth
+    decreasing with the number of observations
+
+    :param observed: indexes of the observations
+    :param n: size of the range
+    :return: density per index
+    """
+    x = np.arange(n)
+    d = np.full(n, TPE_PRIOR / n)
+    sigma = max(1., n / (1. + len(observed)))
+    for o in observed:
+        k = np.exp(-0.5 * ((x - o) / sigma) ** 2)
+        d += k / k.sum()
+    return d / d.sum()
+
+
+def __in_range(node, v):
+    # checks if the value is in the range (booleans excluded)
+    return not isinstance(v, bool) and isinstance(v, (int, float)) and v in node.index
+
+
+def __contains(node, v):
+    # checks if the value can be generated by the node of the space
+    if isinstance(node, (HyperRangeInt, HyperRangeFloat)):
+        return __in_range(node, v)
+    elif isinstance(node, AbstractHyper):
+        return any([__contains(c, v) for c in node.vals])
+    elif isinstance(node, list):
+        return any([__same(c, v) for c in node])
+    return __same(node, v)
+
+
+def __same(a, b):
+    # equality of values, where booleans are not numbers and tuples are lists (as in json)
+    if isinstance(a, bool) or isinstance(b, bool):
+        return a is b
+    if isinstance(a, (list, tuple)) and isinstance(b, (list, tuple)):
+        return len(a) == len(b) and all([__same(x, y) for x, y in zip(a, b)])
+    if isinstance(a, dict) and isinstance(b, dict):
+        return a.keys() == b.keys() and all([__same(a[k], b[k]) for k in a.keys()])
+    return a == b
@@ -1,7 +1,7 @@
 import os
 import pandas as pd
 from .store import exists_key_store, get_key_store, set_key_store, del_key_store
-from .dataset import get_dataset_folder, get_dataset
+from .dataset import get_dataset_folder, get_dataset, update_dataset_version
 
 
 def update_feature_engineering(dataset_id, content):
@@ -96,6 +96,7 @@ def update_specific_metrics(dataset_id, name, best_is_min, content):
     set_key_store('dataset:%s:metrics' % dataset_id, {'name': name, 'best_is_mean': best_is_min})
     with open(get_dataset_folder(dataset_id) + '/data/sm_%s.txt' % dataset_id, 'w') as f:
         f.write(content)
+    update_dataset_version(dataset_id)
 
 
 def delete_specific_metrics(dataset_id):
@@ -108,6 +109,7 @@ def delete_specific_metrics(dataset_id):
     key = 'dataset:%s:metrics' % dataset_id
     if exists_key_store(key):
         del_key_store(key)
+    update_dataset_version(dataset_id)
 
 
 def get_specific_metrics(dataset_id):
@@ -139,11 +141,23 @@ def apply_specific_metrics(dataset_id):
     executes the specific_metrics definition
 
     :param dataset_id: dataset id
-    :return:
+    :return: function of the specific metrics (None if not defined)
     """
     global specific_metrics
     name, best_is_min, content = get_specific_metrics(dataset_id)
     exec_specific_metrics(content)
+    return globals().get('specific_metrics')
+
+
+def set_specific_metrics(f):
+    """
+    sets the function of the specific metrics (eg. executed previously with apply_specific_metrics)
+
+    :param f: function of the specific metrics
+    :return:
+    """
+    global specific_metrics
+    specific_metrics = f
 
 
 def return_specific_metrics(y_act, y_pred):
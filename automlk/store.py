@@ -1,12 +1,59 @@
 import os
 import json
 import time
+import select
+import itertools
+import uuid
 import logging
-from .config import get_use_redis, set_use_redis
+import sqlite3
+import threading
+from collections import deque, OrderedDict
+from contextlib import contextmanager
+from .config import get_use_redis, set_use_redis, get_use_sqlite, set_use_sqlite
 from .context import get_config, get_data_folder
 
 log = logging.getLogger(__name__)
 
+try:
+    import fcntl
+except ImportError:
+    # no file locking available (eg. on windows)
+    fcntl = None
+
+JOURNAL_COMPACT_MIN = 1000   # minimum number of operations in a list journal before compaction
+JOURNAL_COMPACT_RATIO = 2    # compaction when the number of operations exceeds this ratio of the list length
+JOURNAL_CACHE_MAX = 256      # maximum number of list journals kept in memory by a process (least recently used)
+
+# state of the list journals recently read by this process: key -> dict(header, offset, ops, values)
+__journals = OrderedDict()
+
+BRPOP_TIMEOUT = 1            # default timeout in seconds of a blocking pop in file store
+BRPOP_POLL = 0.1             # polling delay of a blocking pop in file store when notifications are not available
+CODEC_MARKER = b'\x00MP'     # prefix of the values encoded with msgpack (a json value cannot start with this byte)
+SQLITE_TIMEOUT = 60          # maximum waiting time in seconds for a lock on the sqlite database
+SQLITE_POLL_MAX = 0.5        # maximum polling delay of a blocking pop in sqlite store (with backoff)
+MGET_SCAN_MIN = 10           # minimum number of keys to read with a scan of the folder in file store
+CACHE_TTL_KEYS = {}          # time to live in seconds of specific key prefixes in the cache, eg {'monitor:': 0}
+
+# process cache of the values: key -> (raw value, expiry time, signature of the file)
+__cache = {}
+__cache_ttl = 0
+__cache_gen = 0
+__cache_stats = {'hits': 0, 'misses': 0, 'invalidations': 0}
+__cache_listener = None
+
+# pipeline of the current batch of updates in redis (per thread)
+__batch = threading.local()
+
+# connection to the sqlite database (per thread)
+__sql = threading.local()
+
+SQLITE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS kv (key TEXT PRIMARY KEY, value TEXT) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS lists (key TEXT, pos INTEGER, value TEXT, PRIMARY KEY (key, pos)) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS sets (key TEXT, value TEXT, PRIMARY KEY (key, value)) WITHOUT ROWID;
+"""
+
 # try to import redis
 __config = get_config()
 if __config['store'] == 'redis':
@@ -18,14 +65,64 @@ if __config['store'] == 'redis':
     except:
         set_use_redis(False)
         log.error('redis not installed: using file storage instead')
+elif __config['store'] == 'sqlite':
+    set_use_sqlite(True)
+
+# binary codec for the values in redis and sqlite store
+__codec = __config['store_codec']
+if __codec == 'msgpack':
+    try:
+        import msgpack
+    except:
+        __codec = 'json'
+        log.error('msgpack not installed: using json encoding instead')
 
 if not get_use_redis():
-    # we will use simple file storage
+    # we will use simple file storage (or the sqlite database in this folder)
     store_folder = get_data_folder() + '/store'
     if not store_folder:
         os.makedirs(store_folder)
 
 
+def set_cache_store(ttl, ttl_keys=None):
+    """
+    activates the cache of the values read with get_key_store in this process
+
+    the values are invalidated when updated in this process, and when updated by other processes:
+    with file modification time in file store, or with keyspace notifications in redis (the values are not cached in
+    sqlite store, which has no notification of the updates by other processes)
+
+    :param ttl: default time to live of the values in the cache in seconds (0 = no cache)
+    :param ttl_keys: specific time to live per key prefix, as a dictionary {prefix: ttl}
+    :return:
+    """
+    global __cache_ttl
+    __cache_ttl = ttl
+    if ttl_keys is not None:
+        CACHE_TTL_KEYS.update(ttl_keys)
+    clear_cache_store()
+
+
+def clear_cache_store():
+    """
+    removes all the values from the cache of this process
+
+    :return:
+    """
+    global __cache_gen
+    __cache.clear()
+    __cache_gen += 1
+
+
+def get_cache_stats():
+    """
+    returns the counters of the cache of this process
+
+    :return: dictionary with hits, misses, invalidations and size of the cache
+    """
+    return {**__cache_stats, 'size': len(__cache)}
+
+
 def get_key_store(key):
     """
     retieves value from key in store
@@ -34,17 +131,119 @@ def get_key_store(key):
     :return: value of the data
     """
     if get_use_redis():
-        return json.loads(rds.get(str(key)))
+        return __decode(__cache_read(key, lambda: rds.get(str(key))))
+    elif get_use_sqlite():
+        raw = __cache_read(key, lambda: __sql_value(key))
+        if raw is not None:
+            return __decode(raw)
+        # upward compatibility with file store: a list can also be read as a value
+        if __sql_conn().execute('SELECT 1 FROM lists WHERE key = ? LIMIT 1', (str(key),)).fetchone() is not None:
+            return list_key_store(key)
+        return None
     else:
-        try:
-            if exists_key_store(key):
-                return json.load(open(store_folder + '/' + __clean_key(key) + '.json', 'r'))
-            else:
-                return None
-        except:
+        if os.path.exists(__journal_file(key)):
+            return __file_value(key, True)
+        elif os.path.exists(store_folder + '/' + __clean_key(key) + '.json'):
+            return __file_value(key, False)
+        else:
             return None
 
 
+def mget_key_store(keys):
+    """
+    retrieves the values of a list of keys in a single access to the store
+
+    :param keys: list of keys
+    :return: list of values (None for a key not found)
+    """
+    if get_use_redis():
+        raws = [__cache_get(key) for key in keys]
+        missing = [i for i, raw in enumerate(raws) if raw is None]
+        if len(missing) > 0:
+            gen = __cache_gen
+            for i, raw in zip(missing, rds.mget([str(keys[i]) for i in missing])):
+                raws[i] = raw
+                __cache_put(keys[i], raw, gen)
+        return [__decode(raw) if raw is not None else None for raw in raws]
+    elif get_use_sqlite():
+        raws = [__cache_get(key) for key in keys]
+        missing = [str(keys[i]) for i, raw in enumerate(raws) if raw is None]
+        gen = __cache_gen
+        found = {}
+        # the number of parameters of a sqlite query is limited
+        for i in range(0, len(missing), 500):
+            chunk = missing[i:i + 500]
+            found.update(__sql_conn().execute('SELECT key, value FROM kv WHERE key IN (%s)' %
+                                              ','.join(['?'] * len(chunk)), chunk).fetchall())
+        for i, key in enumerate(keys):
+            if raws[i] is None and str(key) in found:
+                raws[i] = found[str(key)]
+                __cache_put(key, raws[i], gen)
+        return [__decode(raw) if raw is not None else None for raw in raws]
+    else:
+        if len(keys) < MGET_SCAN_MIN:
+            return [get_key_store(key) for key in keys]
+        # a single scan of the store folder avoids to check the existence of each file
+        names = set(os.listdir(store_folder))
+        values = []
+        for key in keys:
+            if __clean_key(key) + '.jnl' in names:
+                values.append(__file_value(key, True))
+            elif __clean_key(key) + '.json' in names:
+                values.append(__file_value(key, False))
+            else:
+                values.append(None)
+        return values
+
+
+def mset_key_store(values):
+    """
+    sets the values of multiple keys in a single access to the store
+
+    :param values: dictionary {key: value}
+    """
+    for key in values.keys():
+        __cache_invalidate(key)
+    if get_use_redis():
+        __rds().mset({str(key): __encode(value) for key, value in values.items()})
+    elif get_use_sqlite():
+        with __sql_transaction() as conn:
+            for key, value in values.items():
+                __sql_delete(conn, key)
+            conn.executemany('INSERT INTO kv VALUES (?, ?)', [(str(key), __encode(value))
+                                                              for key, value in values.items()])
+    else:
+        for key, value in values.items():
+            set_key_store(key, value)
+
+
+@contextmanager
+def batch_key_store():
+    """
+    groups the updates to the store in a single access (a redis transaction), executed at the end of the block:
+
+        with batch_key_store():
+            set_key_store(key1, value1)
+            del_key_store(key2)
+
+    the reading functions are not delayed, the updates are grouped in a single transaction in redis and sqlite store,
+    and executed immediately in file store
+
+    """
+    if get_use_redis() and getattr(__batch, 'pipe', None) is None:
+        __batch.pipe = rds.pipeline(transaction=True)
+        try:
+            yield
+            __batch.pipe.execute()
+        finally:
+            __batch.pipe = None
+    elif get_use_sqlite():
+        with __sql_transaction():
+            yield
+    else:
+        yield
+
+
 def set_key_store(key, value):
     """
     sets value to key in store
@@ -52,11 +251,32 @@ def set_key_store(key, value):
     :param key: key of the data
     :param value: value of the data to store
     """
+    __cache_invalidate(key)
     if get_use_redis():
-        rds.set(str(key), json.dumps(value))
+        __rds().set(str(key), __encode(value))
+    elif get_use_sqlite():
+        with __sql_transaction() as conn:
+            __sql_delete(conn, key)
+            conn.execute('INSERT INTO kv VALUES (?, ?)', (str(key), __encode(value)))
     else:
-        with open(store_folder + '/' + __clean_key(key) + '.json', 'w') as f:
+        if os.path.exists(__journal_file(key)):
+            # the key is no more a list: the journal is replaced by the value
+            with __journal_lock(key):
+                __journal_remove(key)
+        # the value is replaced atomically, by a new file: the readers never see a partial value
+        filename = store_folder + '/' + __clean_key(key) + '.json'
+        tmp = filename + '.%d.%d.tmp' % (os.getpid(), threading.get_ident())
+        with open(tmp, 'w') as f:
             json.dump(value, f)
+        # the modification time is the generation of the value for the cache: strictly increasing, even for updates
+        # within the resolution of the clock of the file system
+        try:
+            previous = os.stat(filename).st_mtime_ns
+        except FileNotFoundError:
+            previous = 0
+        t = max(time.time_ns(), previous + 1)
+        os.utime(tmp, ns=(t, t))
+        os.replace(tmp, filename)
 
 
 def exists_key_store(key):
@@ -68,8 +288,14 @@ def exists_key_store(key):
     """
     if get_use_redis():
         return rds.exists(str(key))
+    elif get_use_sqlite():
+        conn = __sql_conn()
+        for table in ['kv', 'lists', 'sets']:
+            if conn.execute('SELECT 1 FROM %s WHERE key = ? LIMIT 1' % table, (str(key),)).fetchone() is not None:
+                return True
+        return False
     else:
-        return os.path.exists(store_folder + '/' + __clean_key(key) + '.json')
+        return os.path.exists(store_folder + '/' + __clean_key(key) + '.json') or os.path.exists(__journal_file(key))
 
 
 def del_key_store(key):
@@ -79,11 +305,22 @@ def del_key_store(key):
     :param key: key of the data
     :return: None
     """
+    __cache_invalidate(key)
     if get_use_redis():
-        rds.delete(str(key))
+        __rds().delete(str(key))
+    elif get_use_sqlite():
+        with __sql_transaction() as conn:
+            __sql_delete(conn, key)
     else:
-        if exists_key_store(key):
-            os.remove(store_folder + '/' + __clean_key(key) + '.json')
+        if os.path.exists(__journal_file(key)):
+            with __journal_lock(key):
+                __journal_remove(key)
+        for ext in ['.json', '.lock', '.fifo']:
+            # including the lock and named pipe of a list
+            try:
+                os.remove(store_folder + '/' + __clean_key(key) + ext)
+            except OSError:
+                pass
 
 
 def incr_key_store(key, amount=1):
@@ -94,8 +331,15 @@ def incr_key_store(key, amount=1):
     :param amount: amount to add
     :return: new value
     """
+    __cache_invalidate(key)
     if get_use_redis():
         return rds.incr(str(key), amount)
+    elif get_use_sqlite():
+        with __sql_transaction() as conn:
+            if conn.execute('UPDATE kv SET value = CAST(value AS INTEGER) + ? WHERE key = ?',
+                            (amount, str(key))).rowcount == 0:
+                conn.execute('INSERT INTO kv VALUES (?, ?)', (str(key), json.dumps(amount)))
+            return int(conn.execute('SELECT value FROM kv WHERE key = ?', (str(key),)).fetchone()[0])
     else:
         if exists_key_store(key):
             value = get_key_store(key)
@@ -118,6 +362,9 @@ def get_counter_store(key):
             return int(rds.get(str(key)))
         else:
             return 0
+    elif get_use_sqlite():
+        value = __sql_value(key)
+        return int(value) if value is not None else 0
     else:
         if exists_key_store(key):
             return get_key_store(key)
@@ -134,16 +381,16 @@ def rpush_key_store(key, value):
     :return: None
     """
     if get_use_redis():
-        rds.rpush(str(key), json.dumps(value))
+        __rds().rpush(str(key), __encode(value))
+    elif get_use_sqlite():
+        with __sql_transaction() as conn:
+            pos = conn.execute('SELECT MAX(pos) FROM lists WHERE key = ?', (str(key),)).fetchone()[0]
+            conn.execute('INSERT INTO lists VALUES (?, ?, ?)', (str(key), 0 if pos is None else pos + 1,
+                                                               __encode(value)))
     else:
-        if exists_key_store(key):
-            l = get_key_store(key)
-            if isinstance(l, list):
-                set_key_store(key, l + [value])
-            else:
-                set_key_store(key, [value])
-        else:
-            set_key_store(key, [value])
+        with __journal_lock(key):
+            __journal_write(key, __journal_load(key), [['R', value]])
+        __fifo_notify(key)
 
 
 def rpop_key_store(key):
@@ -154,19 +401,12 @@ def rpop_key_store(key):
     :return: value
     """
     if get_use_redis():
-        return json.loads(rds.rpop(str(key)))
+        return __decode(rds.rpop(str(key)))
+    elif get_use_sqlite():
+        return __sql_pop(key)
     else:
-        if exists_key_store(key):
-            l = get_key_store(key)
-            if isinstance(l, list):
-                e = l[0]
-                set_key_store(key, l[1:])
-                return e
-            else:
-                set_key_store(key, [])
-                return []
-        else:
-            return None
+        with __journal_lock(key):
+            return __journal_pop(key)
 
 
 def lrem_key_store(key, value):
@@ -174,43 +414,76 @@ def lrem_key_store(key, value):
     removes value from the list of key in store
 
     :param key: key of the data
-    :return: value of the data
-    :return: None
+    :param value: value to remove
+    :return: number of elements removed (None in a batch in redis)
     """
     if get_use_redis():
-        rds.lrem(str(key), json.dumps(value))
+        # the value may have been stored with json or with the codec
+        n = 0
+        for raw in set([json.dumps(value), __encode(value)]):
+            r = __rds().lrem(str(key), raw)
+            n = n + r if isinstance(r, int) else None
+        return n
+    elif get_use_sqlite():
+        n = 0
+        with __sql_transaction() as conn:
+            for raw in set([json.dumps(value), __encode(value)]):
+                n += conn.execute('DELETE FROM lists WHERE key = ? AND value = ?', (str(key), raw)).rowcount
+        return n
     else:
-        if exists_key_store(key):
-            l = get_key_store(key)
-            lr = [x for x in l if x != value]
-            set_key_store(key, lr)
+        if not exists_key_store(key):
+            return 0
+        # the value is compared as read from the journal (eg. tuples as lists)
+        value = json.loads(json.dumps(value))
+        with __journal_lock(key):
+            state = __journal_load(key)
+            n = list(state['values']).count(value)
+            if n > 0:
+                __journal_write(key, state, [['X', value]])
+        return n
 
 
-def brpop_key_store(key):
+def brpop_key_store(key, timeout=None, dest=None):
     """
     returns and pop the 1st element of a list of key in store with blocking
 
+    in file store, the waiting processes of the host are woken up through a named pipe when a value is pushed,
+    and the sqlite store is polled with an increasing delay
+
     :param key: key of the data
-    :return: value
+    :param timeout: maximum waiting time in seconds (None = no limit in redis, BRPOP_TIMEOUT in file/sqlite store)
+    :param dest: key of a list where the element is pushed at the beginning in the same operation (optional)
+    :return: value, or None if the timeout is reached
     """
     if get_use_redis():
-        return json.loads(rds.brpop(str(key))[1])
+        if dest is not None:
+            msg = rds.brpoplpush(str(key), str(dest), 0 if timeout is None else max(1, int(timeout)))
+            return None if msg is None else __decode(msg)
+        msg = rds.brpop(str(key), 0 if timeout is None else max(1, int(timeout)))
+        if msg is None:
+            return None
+        return __decode(msg[1])
     else:
-        if exists_key_store(key):
-            l = get_key_store(key)
-            if isinstance(l, list) and len(l) > 0:
-                e = l[0]
-                if len(l) > 1:
-                    set_key_store(key, l[1:])
-                else:
-                    set_key_store(key, [])
-                return e
-            else:
-                time.sleep(1)
-                return None
-        else:
-            time.sleep(1)
+        e = __brpop([key], timeout, dest)
+        return None if e is None else e[1]
+
+
+def brpop_keys_store(keys, timeout=None):
+    """
+    returns and pop the 1st element of the first list not empty among several lists, with blocking (as brpop in
+    redis with several keys)
+
+    :param keys: list of keys, in order of priority
+    :param timeout: maximum waiting time in seconds (None = no limit in redis, BRPOP_TIMEOUT in file/sqlite store)
+    :return: (key, value), or None if the timeout is reached
+    """
+    if get_use_redis():
+        msg = rds.brpop([str(key) for key in keys], 0 if timeout is None else max(1, int(timeout)))
+        if msg is None:
             return None
+        return keys[[str(key) for key in keys].index(msg[0].decode())], __decode(msg[1])
+    else:
+        return __brpop(keys, timeout, None)
 
 
 def lpush_key_store(key, value):
@@ -222,16 +495,49 @@ def lpush_key_store(key, value):
     :return: None
     """
     if get_use_redis():
-        rds.lpush(str(key), json.dumps(value))
+        __rds().lpush(str(key), __encode(value))
+    elif get_use_sqlite():
+        with __sql_transaction() as conn:
+            pos = conn.execute('SELECT MIN(pos) FROM lists WHERE key = ?', (str(key),)).fetchone()[0]
+            conn.execute('INSERT INTO lists VALUES (?, ?, ?)', (str(key), 0 if pos is None else pos - 1,
+                                                               __encode(value)))
     else:
-        if exists_key_store(key):
-            l = get_key_store(key)
-            if isinstance(l, list):
-                set_key_store(key, [value] + l)
-            else:
-                set_key_store(key, [value])
+        with __journal_lock(key):
+            __journal_write(key, __journal_load(key), [['L', value]])
+        __fifo_notify(key)
+
+
+def lrange_key_store(key, start, stop=-1):
+    """
+    returns a range of values of a list, as in redis: indexes from 0, negative indexes from the end, stop included
+
+    :param key: key of the data
+    :param start: index of the first value
+    :param stop: index of the last value (default -1 = end of the list)
+    :return: list (the values may be shared with the cache of the process: not to be modified)
+    """
+    if get_use_redis():
+        return [__decode(x) for x in rds.lrange(str(key), start, stop)]
+    elif get_use_sqlite():
+        if start < 0 or stop < 0:
+            start, stop = __range_bounds(start, stop, llen_key_store(key))
         else:
-            set_key_store(key, [value])
+            stop += 1
+        if stop <= start:
+            return []
+        return [__decode(x) for (x,) in __sql_conn().execute(
+            'SELECT value FROM lists WHERE key = ? ORDER BY pos LIMIT ? OFFSET ?', (str(key), stop - start, start))]
+    else:
+        with __journal_lock(key, exclusive=False):
+            state = __journal_read(key)
+        if state is not None:
+            values = state['values']
+            start, stop = __range_bounds(start, stop, len(values))
+            # the values are shared with the state of the journal: not to be modified by the caller
+            return list(itertools.islice(values, start, max(start, stop)))
+        l = list_key_store(key)
+        start, stop = __range_bounds(start, stop, len(l))
+        return l[start:stop]
 
 
 def list_key_store(key):
@@ -239,13 +545,21 @@ def list_key_store(key):
     returns the complete list of values
 
     :param key: key of the data
-    :return: list
+    :return: list (the values may be shared with the cache of the process: not to be modified)
     """
     if get_use_redis():
-        return [json.loads(x) for x in rds.lrange(key, 0, -1)]
+        return [__decode(x) for x in rds.lrange(key, 0, -1)]
+    elif get_use_sqlite():
+        return [__decode(x) for (x,) in __sql_conn().execute('SELECT value FROM lists WHERE key = ? ORDER BY pos',
+                                                              (str(key),))]
     else:
+        with __journal_lock(key, exclusive=False):
+            state = __journal_read(key)
+        if state is not None:
+            # the values are shared with the state of the journal: not to be modified by the caller
+            return list(state['values'])
         l = get_key_store(key)
-        if l != None:
+        if isinstance(l, list):
             return l
         else:
             return []
@@ -260,13 +574,16 @@ def llen_key_store(key):
     """
     if get_use_redis():
         return rds.llen(str(key))
+    elif get_use_sqlite():
+        return __sql_conn().execute('SELECT COUNT(*) FROM lists WHERE key = ?', (str(key),)).fetchone()[0]
     else:
-        if exists_key_store(key):
-            l = get_key_store(key)
-            if isinstance(l, list):
-                return len(l)
-            else:
-                return 0
+        with __journal_lock(key, exclusive=False):
+            state = __journal_read(key)
+        if state is not None:
+            return len(state['values'])
+        l = get_key_store(key)
+        if isinstance(l, list):
+            return len(l)
         else:
             return 0
 
@@ -276,18 +593,23 @@ def sadd_key_store(key, value):
     add value to set key
 
     :param key: key of the data
-    :return: value of the data
-    :return: None
+    :param value: value of the data
+    :return: number of values added (0 if already in the set)
     """
     if get_use_redis():
-        return rds.sadd(str(key), json.dumps(value))
+        return __rds().sadd(str(key), json.dumps(value))
+    elif get_use_sqlite():
+        with __sql_transaction() as conn:
+            return conn.execute('INSERT OR IGNORE INTO sets VALUES (?, ?)', (str(key), json.dumps(value))).rowcount
     else:
-        if exists_key_store(key):
-            l = get_key_store(key)
-            if value not in l:
-                set_key_store(key, [value] + l)
-        else:
-            set_key_store(key, [value])
+        # the set is a list in the journal: a new value is appended, without writing the whole set
+        value = json.loads(json.dumps(value))
+        with __journal_lock(key):
+            state = __journal_load(key)
+            if value in state['values']:
+                return 0
+            __journal_write(key, state, [['R', value]])
+        return 1
 
 
 def smembers_key_store(key):
@@ -295,12 +617,31 @@ def smembers_key_store(key):
     returns members of set key
 
     :param key: key of the data
-    :return: list
+    :return: list (empty if the key does not exist)
     """
     if get_use_redis():
         return [json.loads(m) for m in rds.smembers(str(key))]
+    elif get_use_sqlite():
+        return [json.loads(x) for (x,) in __sql_conn().execute('SELECT value FROM sets WHERE key = ?', (str(key),))]
     else:
-        return get_key_store(key)
+        return list_key_store(key)
+
+
+def sismember_key_store(key, value):
+    """
+    checks if value is a member of set key
+
+    :param key: key of the data
+    :param value: value of the data
+    :return: True if value is in the set
+    """
+    if get_use_redis():
+        return bool(__rds().sismember(str(key), json.dumps(value)))
+    elif get_use_sqlite():
+        return __sql_conn().execute('SELECT 1 FROM sets WHERE key = ? AND value = ?',
+                                    (str(key), json.dumps(value))).fetchone() is not None
+    else:
+        return json.loads(json.dumps(value)) in list_key_store(key)
 
 
 def __clean_key(key):
@@ -311,3 +652,581 @@ def __clean_key(key):
     :return: key with : replaces by __
     """
     return str(key).replace(':', '__')
+
+
+def __encode(value):
+    """
+    encodes a value for redis and sqlite store: lists and dictionaries are encoded with the codec of the config,
+    other values (eg. counters) in json
+
+    :param value: value of the data
+    :return: raw value
+    """
+    if __codec == 'msgpack' and isinstance(value, (list, dict)):
+        return CODEC_MARKER + msgpack.packb(__json_keys(value), use_bin_type=True)
+    return json.dumps(value)
+
+
+def __json_keys(value):
+    """
+    converts the keys of the dictionaries in a value to strings, as in json (eg. 1 -> '1', None -> 'null'), so that a
+    value is read the same way with both codecs
+
+    :param value: value of the data
+    :return: value with string keys
+    """
+    if isinstance(value, dict):
+        return {k if isinstance(k, str) else json.dumps(k): __json_keys(v) for k, v in value.items()}
+    elif isinstance(value, (list, tuple)):
+        return [__json_keys(x) for x in value]
+    return value
+
+
+def __decode(raw):
+    """
+    decodes a raw value from redis or sqlite store, in json or with the codec identified by its marker
+
+    :param raw: raw value
+    :return: value of the data
+    """
+    if isinstance(raw, bytes) and raw.startswith(CODEC_MARKER):
+        return msgpack.unpackb(raw[len(CODEC_MARKER):], raw=False, strict_map_key=False)
+    return json.loads(raw)
+
+
+def __range_bounds(start, stop, n):
+    """
+    converts the indexes of a redis range into the bounds of a python slice
+
+    :param start: index of the first value (negative from the end)
+    :param stop: index of the last value, included (negative from the end)
+    :param n: length of the list
+    :return: start, stop of the slice
+    """
+    if start < 0:
+        start = max(0, n + start)
+    if stop < 0:
+        stop = n + stop
+    return min(start, n), min(stop + 1, n)
+
+
+def __rds():
+    """
+    redis connection, or the pipeline of the current batch
+
+    :return: redis object
+    """
+    pipe = getattr(__batch, 'pipe', None)
+    return pipe if pipe is not None else rds
+
+
+def __sql_conn():
+    """
+    connection to the sqlite database of this thread, in WAL mode for concurrent access of the processes
+
+    :return: sqlite connection
+    """
+    conn = getattr(__sql, 'conn', None)
+    if conn is None or __sql.pid != os.getpid():
+        # autocommit mode: the transactions are explicit
+        conn = sqlite3.connect(store_folder + '/store.db', timeout=SQLITE_TIMEOUT, isolation_level=None)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        conn.executescript(SQLITE_SCHEMA)
+        __sql.conn = conn
+        __sql.pid = os.getpid()
+    return conn
+
+
+@contextmanager
+def __sql_transaction():
+    """
+    executes the block in a write transaction of sqlite (or in the current transaction if already started)
+
+    :return: sqlite connection
+    """
+    conn = __sql_conn()
+    if conn.in_transaction:
+        yield conn
+    else:
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            yield conn
+            conn.execute('COMMIT')
+        except:
+            conn.execute('ROLLBACK')
+            raise
+
+
+def __sql_value(key):
+    """
+    reads the raw value of a key in sqlite store
+
+    :param key: key of the data
+    :return: raw value or None
+    """
+    row = __sql_conn().execute('SELECT value FROM kv WHERE key = ?', (str(key),)).fetchone()
+    return row[0] if row is not None else None
+
+
+def __sql_delete(conn, key):
+    """
+    deletes a key as a value, a list or a set in sqlite store
+
+    :param conn: sqlite connection in a transaction
+    :param key: key of the data
+    """
+    for table in ['kv', 'lists', 'sets']:
+        conn.execute('DELETE FROM %s WHERE key = ?' % table, (str(key),))
+
+
+def __sql_pop(key, dest=None):
+    """
+    pops the first element of a list in sqlite store
+
+    :param key: key of the data
+    :param dest: key of a list where the element is pushed at the beginning in the same transaction (optional)
+    :return: value, or None if the list is empty
+    """
+    with __sql_transaction() as conn:
+        row = conn.execute('SELECT pos, value FROM lists WHERE key = ? ORDER BY pos LIMIT 1', (str(key),)).fetchone()
+        if row is None:
+            return None
+        conn.execute('DELETE FROM lists WHERE key = ? AND pos = ?', (str(key), row[0]))
+        if dest is not None:
+            pos = conn.execute('SELECT MIN(pos) FROM lists WHERE key = ?', (str(dest),)).fetchone()[0]
+            conn.execute('INSERT INTO lists VALUES (?, ?, ?)', (str(dest), 0 if pos is None else pos - 1, row[1]))
+        return __decode(row[1])
+
+
+def __file_value(key, is_list):
+    """
+    reads the value of a key in file store
+
+    :param key: key of the data
+    :param is_list: the key is stored as a list journal
+    :return: value or None
+    """
+    try:
+        if is_list:
+            return list_key_store(key)
+        return json.loads(__cache_read(key, lambda: open(store_folder + '/' + __clean_key(key) + '.json',
+                                                         'r').read()))
+    except:
+        return None
+
+
+def __cache_read(key, read):
+    """
+    reads the raw value of a key through the cache
+
+    :param key: key of the data
+    :param read: function reading the raw value in the store
+    :return: raw value
+    """
+    if __cache_key_ttl(key) <= 0:
+        return read()
+    if get_use_redis():
+        signature = None
+    else:
+        # the file is replaced with each update (new inode), with a generation as modification time (see set_key_store)
+        stat = os.stat(store_folder + '/' + __clean_key(key) + '.json')
+        signature = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+    value = __cache_get(key, signature)
+    if value is None:
+        gen = __cache_gen
+        value = read()
+        __cache_put(key, value, gen, signature)
+    return value
+
+
+def __cache_get(key, signature=None):
+    """
+    returns the raw value of a key if it is in the cache and still valid
+
+    :param key: key of the data
+    :param signature: signature of the file of the key (file store)
+    :return: raw value or None
+    """
+    if __cache_key_ttl(key) <= 0:
+        return None
+    if get_use_redis() and __cache_listener is None:
+        __start_cache_listener()
+    entry = __cache.get(str(key))
+    if entry is not None and entry[1] > time.time() and entry[2] == signature:
+        __cache_stats['hits'] += 1
+        return entry[0]
+    __cache_stats['misses'] += 1
+    return None
+
+
+def __cache_put(key, value, gen, signature=None):
+    """
+    stores the raw value of a key in the cache
+
+    :param key: key of the data
+    :param value: raw value
+    :param gen: generation of the cache before the value was read in the store
+    :param signature: signature of the file of the key (file store)
+    """
+    ttl = __cache_key_ttl(key)
+    # the value is not cached if an invalidation has been received during the read
+    if ttl > 0 and value is not None and gen == __cache_gen:
+        __cache[str(key)] = (value, time.time() + ttl, signature)
+
+
+def __cache_key_ttl(key):
+    """
+    time to live of a key in the cache
+
+    :param key: key of the data
+    :return: ttl in seconds (0 if not cached)
+    """
+    if __cache_ttl <= 0 or get_use_sqlite():
+        return 0
+    key = str(key)
+    for prefix in sorted(CACHE_TTL_KEYS.keys(), key=len, reverse=True):
+        if key.startswith(prefix):
+            return CACHE_TTL_KEYS[prefix]
+    return __cache_ttl
+
+
+def __cache_invalidate(key):
+    """
+    removes a key from the cache
+
+    :param key: key of the data
+    """
+    global __cache_gen
+    __cache_gen += 1
+    if __cache.pop(str(key), None) is not None:
+        __cache_stats['invalidations'] += 1
+
+
+def __start_cache_listener():
+    """
+    starts the thread listening to the redis keyspace notifications, with the first value read through the cache
+    (no thread is started when the module is imported, eg. in the fork server of the worker)
+    """
+    global __cache_listener
+    __cache_listener = threading.Thread(target=__cache_listen, daemon=True)
+    __cache_listener.start()
+
+
+def __cache_listen():
+    """
+    listens to redis keyspace notifications in order to invalidate the keys updated by other processes
+
+    the flags "K" and "A" are required in the option notify-keyspace-events of the server (not modified here, as the
+    option is shared by all the clients of the server): without them, the cache relies on time to live only
+    """
+    try:
+        flags = rds.config_get('notify-keyspace-events')['notify-keyspace-events']
+        missing = ''.join([c for c in 'KA' if c not in flags])
+        if missing != '':
+            log.warning('flags %s missing in notify-keyspace-events of the redis server: cache relies on time to live '
+                        'only' % missing)
+            return
+        pubsub = rds.pubsub()
+        pubsub.psubscribe('__keyspace@*__:*')
+        for msg in pubsub.listen():
+            if msg['type'] == 'pmessage':
+                __cache_invalidate(msg['channel'].decode().split(':', 1)[1])
+    except Exception as e:
+        log.error('keyspace notifications not available (%s): cache relies on time to live only' % e)
+
+
+def __brpop(keys, timeout, dest):
+    """
+    blocking pop on several lists in file and sqlite store (see brpop_key_store)
+
+    :param keys: list of keys, in order of priority
+    :param timeout: maximum waiting time in seconds (None = BRPOP_TIMEOUT)
+    :param dest: key of a list where the element is pushed at the beginning in the same operation (optional)
+    :return: (key, value), or None if the timeout is reached
+    """
+    if timeout is None:
+        timeout = BRPOP_TIMEOUT
+    t_end = time.time() + timeout
+    if get_use_sqlite():
+        delay = BRPOP_POLL / 10
+        while True:
+            for key in keys:
+                e = __sql_pop(key, dest)
+                if e is not None:
+                    return key, e
+            remaining = t_end - time.time()
+            if remaining <= 0:
+                return None
+            # polling with backoff
+            time.sleep(min(remaining, delay))
+            delay = min(delay * 2, SQLITE_POLL_MAX)
+    # the pipes are opened before checking the lists, in order not to miss a notification
+    fds = [__fifo_open(key) for key in keys]
+    try:
+        while True:
+            for key in keys:
+                if exists_key_store(key):
+                    with __journal_lock(key):
+                        e = __journal_pop(key)
+                        if e is not None and dest is not None:
+                            lpush_key_store(dest, e)
+                    if e is not None:
+                        return key, e
+            remaining = t_end - time.time()
+            if remaining <= 0:
+                return None
+            if None in fds:
+                time.sleep(min(remaining, BRPOP_POLL))
+            else:
+                for fd in select.select(fds, [], [], remaining)[0]:
+                    # consumes one notification
+                    try:
+                        os.read(fd, 1)
+                    except BlockingIOError:
+                        pass
+    finally:
+        for fd in fds:
+            if fd is not None:
+                os.close(fd)
+
+
+def __fifo_open(key):
+    """
+    opens the named pipe used to wake up the processes waiting for a value in a list (file store)
+
+    :param key: key of the data
+    :return: file descriptor, or None if named pipes are not available (eg. on windows)
+    """
+    if not hasattr(os, 'mkfifo'):
+        return None
+    filename = store_folder + '/' + __clean_key(key) + '.fifo'
+    try:
+        if not os.path.exists(filename):
+            os.mkfifo(filename)
+    except FileExistsError:
+        pass
+    except OSError:
+        return None
+    try:
+        # opened also in write mode, in order to avoid end of file when there is no writer
+        return os.open(filename, os.O_RDWR | os.O_NONBLOCK)
+    except OSError:
+        return None
+
+
+def __fifo_notify(key):
+    """
+    wakes up a process waiting for a value in a list (file store)
+
+    :param key: key of the data
+    """
+    if not hasattr(os, 'mkfifo'):
+        return
+    try:
+        # fails if the pipe does not exist or if no process is waiting
+        fd = os.open(store_folder + '/' + __clean_key(key) + '.fifo', os.O_WRONLY | os.O_NONBLOCK)
+    except OSError:
+        return
+    try:
+        os.write(fd, b'.')
+    except OSError:
+        # pipe full: the waiting processes have already been notified
+        pass
+    finally:
+        os.close(fd)
+
+
+def __journal_file(key):
+    """
+    name of the journal file of a list in file store
+
+    :param key: key of the data
+    :return: file name
+    """
+    return store_folder + '/' + __clean_key(key) + '.jnl'
+
+
+@contextmanager
+def __journal_lock(key, exclusive=True):
+    """
+    locks the journal of a list between processes (no locking if fcntl is not available)
+
+    :param key: key of the data
+    :param exclusive: exclusive lock for updates, else shared lock for reading
+    """
+    filename = store_folder + '/' + __clean_key(key) + '.lock'
+    if not exclusive and not os.path.exists(filename):
+        # nothing to read: the lock file is not created again after the deletion of the list
+        yield
+        return
+    with open(filename, 'a') as f:
+        if fcntl is not None:
+            fcntl.flock(f, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def __journal_read(key):
+    """
+    updates the state of the list in this process with the operations appended to the journal since last read
+
+    the journal is a text file with one json operation per line:
+    ['H', generation id], ['S', snapshot of values], ['R', value], ['L', value], ['P'] (pop first) or ['X', value]
+
+    :param key: key of the data
+    :return: state of the list, or None if there is no journal
+    """
+    try:
+        f = open(__journal_file(key), 'rb')
+    except FileNotFoundError:
+        __journals.pop(key, None)
+        return None
+    with f:
+        header = f.readline()
+        state = __journals.pop(key, None)
+        if state is None or state['header'] != header:
+            # new or compacted journal: read from the beginning
+            state = {'header': header, 'offset': len(header), 'ops': 0, 'values': deque()}
+        f.seek(state['offset'])
+        data = f.read()
+    # only complete lines are applied
+    end = data.rfind(b'\n') + 1
+    for line in data[:end].splitlines():
+        __journal_apply(state, json.loads(line.decode()))
+    state['offset'] += end
+    __journal_keep(key, state)
+    return state
+
+
+def __journal_apply(state, op):
+    """
+    applies an operation of the journal to the state of the list
+
+    :param state: state of the list
+    :param op: operation
+    """
+    values = state['values']
+    if op[0] == 'R':
+        values.append(op[1])
+    elif op[0] == 'L':
+        values.appendleft(op[1])
+    elif op[0] == 'P':
+        if len(values) > 0:
+            values.popleft()
+    elif op[0] == 'X':
+        state['values'] = deque([x for x in values if x != op[1]])
+    elif op[0] == 'S':
+        state['values'] = deque(op[1])
+    state['ops'] += 1
+
+
+def __journal_load(key):
+    """
+    returns the state of the list, and creates the journal if it does not exist
+
+    :param key: key of the data
+    :return: state of the list
+    """
+    state = __journal_read(key)
+    if state is None:
+        # upward compatibility: a list previously stored as a single json value is migrated in the journal
+        filename = store_folder + '/' + __clean_key(key) + '.json'
+        values = []
+        if os.path.exists(filename):
+            l = json.load(open(filename, 'r'))
+            if isinstance(l, list):
+                values = l
+        state = __journal_compact(key, values)
+        if os.path.exists(filename):
+            os.remove(filename)
+    return state
+
+
+def __journal_write(key, state, ops):
+    """
+    appends operations to the journal, and compacts the journal when it is much larger than the list
+
+    :param key: key of the data
+    :param state: state of the list (up to date with the journal)
+    :param ops: list of operations
+    """
+    data = b''.join([json.dumps(op).encode() + b'\n' for op in ops])
+    with open(__journal_file(key), 'ab') as f:
+        f.write(data)
+    # the operations are applied as read from the journal by the other processes (eg. tuples as lists)
+    for line in data.splitlines():
+        __journal_apply(state, json.loads(line.decode()))
+    state['offset'] += len(data)
+    if state['ops'] > max(JOURNAL_COMPACT_MIN, JOURNAL_COMPACT_RATIO * len(state['values'])):
+        __journal_compact(key, list(state['values']))
+
+
+def __journal_compact(key, values):
+    """
+    rewrites the journal as a single snapshot of the values
+
+    :param key: key of the data
+    :param values: list of values
+    :return: state of the list
+    """
+    header = json.dumps(['H', uuid.uuid4().hex]).encode() + b'\n'
+    data = header + json.dumps(['S', values]).encode() + b'\n'
+    filename = __journal_file(key)
+    with open(filename + '.tmp', 'wb') as f:
+        f.write(data)
+    os.replace(filename + '.tmp', filename)
+    state = {'header': header, 'offset': len(data), 'ops': 1, 'values': deque(values)}
+    __journals.pop(key, None)
+    __journal_keep(key, state)
+    return state
+
+
+def __journal_keep(key, state):
+    """
+    keeps the state of the list as the most recently used, and forgets the least recently used lists beyond
+    JOURNAL_CACHE_MAX (their journal is read again from the beginning when needed)
+
+    :param key: key of the data
+    :param state: state of the list
+    """
+    __journals[key] = state
+    while len(__journals) > JOURNAL_CACHE_MAX:
+        __journals.popitem(last=False)
+
+
+def __journal_pop(key):
+    """
+    pops the first element of the list (the journal must be locked)
+
+    :param key: key of the data
+    :return: value, or None if the list is empty
+    """
+    if not exists_key_store(key):
+        return None
+    state = __journal_load(key)
+    if len(state['values']) == 0:
+        return None
+    # no copy: the value is removed from the state by the pop
+    e = state['values'][0]
+    __journal_write(key, state, [['P']])
+    return e
+
+
+def __journal_remove(key):
+    """
+    deletes the journal of a list (the journal must be locked)
+
+    :param key: key of the data
+    """
+    if os.path.exists(__journal_file(key)):
+        os.remove(__journal_file(key))
+    __journals.pop(key, None)
+
+
+# activates the cache of values if defined in the configuration
+if __config['store_cache'] > 0:
+    set_cache_store(__config['store_cache'])
@@ -1,36 +1,99 @@
 import eli5
 import threading
+import multiprocessing
 import _thread
+import gzip
+import queue
+import atexit
+import mmap
 import sys
 import os
-from copy import deepcopy
+from copy import copy, deepcopy
+from collections import OrderedDict
 from .config import *
-from .dataset import get_dataset, get_dataset_status
-from .graphs import graph_histogram_regression, graph_histogram_classification, graph_predict_regression, \
-    graph_predict_classification
-from .prepare import get_eval_sets
+from .dataset import get_dataset, get_dataset_status, get_dataset_version
+from .graphs import create_cnf_matrix
+from .prepare import get_eval_sets, copy_eval_set
 from .solutions import *
 from .monitor import *
 from .metrics import evaluate_metric
-from .specific import apply_specific_metrics, return_specific_metrics
+from .specific import apply_specific_metrics, set_specific_metrics, return_specific_metrics
 from .solutions_pp import pp_solutions_map
-from .results import get_pred_eval_test
+from .results import get_best_models, get_round_model
+from .pp_cache import get_pp_cache, set_pp_cache
+from .leaderboard import prune_folds
+from .pred_store import set_pred_eval_test, get_pred_rounds
 from .xyset import XySet
 from sklearn.pipeline import make_pipeline
 
 
+WORKER_WAIT = 10             # maximum waiting time in seconds for a job, between heart beeps
+ARTIFACTS_QUEUE = 4          # maximum number of rounds with artifacts waiting to be written
+ROUNDS_CACHE_MAX = 8         # maximum number of datasets with their results kept in a process (least recently used)
+
 log = logging.getLogger(__name__)
 
+# job in progress in the worker, and its lease (when the jobs are acknowledged)
+__worker_id = ''
+__worker_lease = 0
+__worker_job = None
+
+# arguments of the heart beep of the worker during a job: msg, index of the worker, gpu
+__worker_beep = None
+
+# datasets loaded in the worker, by least recently used: dataset_id -> (version, dataset, eval set, metrics, size)
+__datasets_cache = OrderedDict()
+__worker_cache_size = 0
+
+# model and data of the cross validation in progress, in a process of the pool of the folds
+__fold_context = None
+
+# artifacts of the rounds (models, graphs, ...) waiting to be written by the background writer
+__artifacts = None
+
+# results of the search recently loaded in this process, by least recently used:
+# dataset_id -> (results, dataframe, signature of the last round)
+__rounds_cache = OrderedDict()
+
 
 def get_search_rounds(dataset_id):
     """
     get all the results of the search with preprocessing and models
 
+    the results are kept in this process (for the ROUNDS_CACHE_MAX datasets most recently used), and only the rounds
+    added since the last call are read from the store: the dataframe is built again only when there are new rounds
+
     :param dataset_id: id of the dataset
     :return: results of the search as a dataframe
     """
-    results = list_key_store('dataset:%s:rounds' % dataset_id)
-    return pd.DataFrame(results)
+    results, df, last = __rounds_cache.pop(dataset_id, ([], None, None))
+    n = len(results)
+    if n > 0:
+        # the last round already loaded is read again, in order to detect a reset of the search
+        new = lrange_key_store('dataset:%s:rounds' % dataset_id, n - 1, -1)
+        if len(new) > 0 and __round_signature(new[0]) == last:
+            new = new[1:]
+        else:
+            results, df, new = [], None, lrange_key_store('dataset:%s:rounds' % dataset_id, 0, -1)
+    else:
+        new = lrange_key_store('dataset:%s:rounds' % dataset_id, 0, -1)
+
+    if len(new) > 0:
+        results.extend(new)
+        df = None
+        last = __round_signature(new[-1])
+    if df is None:
+        df = pd.DataFrame(results)
+    __rounds_cache[dataset_id] = (results, df, last)
+    while len(__rounds_cache) > ROUNDS_CACHE_MAX:
+        __rounds_cache.popitem(last=False)
+    # shallow copy: the columns added or replaced by the caller are not in the cache
+    return df.copy(deep=False)
+
+
+def __round_signature(msg):
+    # identifies a result in the history of the search
+    return msg.get('round_id'), msg.get('start_time'), msg.get('host_name')
 
 
 def create_model_json(dataset_id, round_id):
@@ -46,13 +109,13 @@ def create_model_json(dataset_id, round_id):
 
     d = {}
     for key in ['solution', 'pipeline', 'model_params', 'mode', 'model_class', 'level']:
-        d[key] = round[key]
+        d[key] = deepcopy(round[key])
 
     # update n_estimators when early stopping
     solution = model_solutions_map[round['solution']]
     if solution.early_stopping != '':
-        model = pickle.load(open(get_dataset_folder(dataset_id) + '/models/%s_model.pkl' % round_id, 'rb'))
-        if hasattr(model, 'n_estimators'):
+        pipe_transform, pipe_model, model = get_round_model(dataset_id, round_id)
+        if model is not None and hasattr(model, 'n_estimators'):
             d['model_params']['n_estimators'] = model.n_estimators
 
     filename = get_dataset_folder(dataset_id) + '/models/model_%s.json' % round_id
@@ -80,6 +143,14 @@ def __timer_control(f_stop):
             log.info('dataset %s is no more in searching mode, aborting...' % __worker_dataset)
             _thread.interrupt_main()
 
+    # heart beep during a job (the heart beeps are sent by the loop when waiting for a job)
+    if __worker_dataset != '' and __worker_beep is not None:
+        heart_beep('worker', *__worker_beep)
+
+    # renew the lease of the job in progress
+    if __worker_lease > 0:
+        set_key_store('%s:%s:lease' % (INFLIGHT_WORKERS, __worker_id), t + __worker_lease)
+
     if not f_stop.is_set():
         # call again in 10 seconds
         threading.Timer(10, __timer_control, [f_stop]).start()
@@ -95,17 +166,47 @@ def worker_loop(worker_id, gpu=False):
     global __worker_timer_start
     global __worker_timer_limit
     global __worker_dataset
+    global __worker_id, __worker_lease, __worker_job, __worker_beep
+    global __worker_cache_size
     __worker_dataset = ''
     __worker_timer_start = 0
     __worker_timer_limit = 0
+    __worker_id = socket.gethostname() + '_' + str(worker_id)
+    __worker_lease = get_config()['job_lease']
+    __worker_cache_size = get_config()['worker_cache'] * 1048576
+    __worker_job = None
+    __start_artifacts_writer()
+    if __worker_lease > 0:
+        # jobs left by a previous execution of this worker are sent back to the queue
+        sadd_key_store(INFLIGHT_WORKERS, __worker_id)
+        while True:
+            msg_search = rpop_key_store(__inflight_key())
+            if msg_search is None:
+                break
+            log.info('requeue job of a previous execution %s' % msg_search)
+            lpush_key_store(SEARCH_QUEUE, msg_search)
     f_stop = threading.Event()
     # start calling f now and every 60 sec thereafter
     __timer_control(f_stop)
     while True:
+        msg_search = None
         try:
-            # poll queue
-            msg_search = brpop_key_store('controller:search_queue')
+            # poll queue: the heart beep is sent at least every WORKER_WAIT seconds when the worker is idle
+            if __worker_lease > 0:
+                # the job is kept in the in-flight list of the worker until its result is sent
+                msg_search = brpop_key_store(SEARCH_QUEUE, WORKER_WAIT, dest=__inflight_key())
+                __worker_job = msg_search
+            else:
+                msg_search = brpop_key_store(SEARCH_QUEUE, WORKER_WAIT)
+            if msg_search is not None:
+                # wakes up the controller, to fill the search queue again
+                lpush_key_store(WAKE_QUEUE, 1)
+            if msg_search is not None and get_dataset_status(msg_search['dataset_id']) != 'searching':
+                log.info('job skipped because dataset %s is no more in searching mode' % msg_search['dataset_id'])
+                __ack_job()
+                msg_search = None
             heart_beep('worker', msg_search, worker_id, gpu)
+            __worker_beep = (msg_search, worker_id, gpu)
             __worker_timer_start = time.time()
             __worker_timer_limit = 0
             __worker_dataset = ''
@@ -118,8 +219,16 @@ def worker_loop(worker_id, gpu=False):
                 job_search(msg_search)
         except KeyboardInterrupt:
             log.info('Keyboard interrupt: exiting')
+            if f_stop.is_set():
+                # job aborted by the timer control
+                __ack_job()
+            elif __worker_job is not None:
+                # job interrupted by the user: sent back to the queue
+                lpush_key_store(SEARCH_QUEUE, __worker_job)
+                __ack_job()
             # stop the timer thread
             f_stop.set()
+            __flush_artifacts()
             exit()
         except Exception as e:
             exc_type, exc_obj, exc_tb = sys.exc_info()
@@ -129,6 +238,27 @@ def worker_loop(worker_id, gpu=False):
                 f.write(datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S") + str(msg_search) + '\n')
                 f.write('%s in %s line:%s error: %s' % (exc_type.__name__, fname, str(exc_tb.tb_lineno), str(e)) + '\n')
                 f.write('-'*80 + '\n')
+        finally:
+            # the job is completed, or failed
+            if not f_stop.is_set():
+                __ack_job()
+
+
+def __inflight_key():
+    # list of the jobs in progress in the worker
+    return '%s:%s' % (INFLIGHT_WORKERS, __worker_id)
+
+
+def __ack_job():
+    """
+    acknowledges the job in progress: removes the job from the in-flight list of the worker
+
+    :return:
+    """
+    global __worker_job
+    if __worker_job is not None:
+        lrem_key_store(__inflight_key(), __worker_job)
+        __worker_job = None
 
 
 def job_search(msg_search):
@@ -138,22 +268,20 @@ def job_search(msg_search):
     :param msg_search: message with parameters of the searcg
     :return:
     """
-    # load dataset
-    dataset = get_dataset(msg_search['dataset_id'])
-
-    # define function for specific metric if any
-    if dataset.metric == 'specific':
-        apply_specific_metrics(dataset.dataset_id)
-
-    # load train/eval/test data
-    ds_ini = get_eval_sets(msg_search['dataset_id'])
+    # load dataset, specific metric if any, and train/eval/test data
+    dataset, ds_ini, version = __load_dataset(msg_search['dataset_id'])
 
     if msg_search['level'] == 2:
-        ds_ini = __create_stacking(dataset, __get_pool_models(dataset, msg_search['ensemble_depth']), ds_ini)
+        ds_ini = __create_stacking(dataset, __get_pool_models(dataset, msg_search['ensemble_depth']), copy(ds_ini))
 
     # pre-processing
     t_start = time.time()
-    feature_names, ds, pipe = __pre_processing(dataset, msg_search['pipeline'], deepcopy(ds_ini))
+    if msg_search['level'] == 1:
+        feature_names, ds, pipe, msg_search['pp_cache_depth'] = __cached_pre_processing(dataset, version,
+                                                                                        msg_search['pipeline'], ds_ini)
+    else:
+        feature_names, ds, pipe = __pre_processing(dataset, msg_search['pipeline'], copy_eval_set(ds_ini))
+        msg_search['pp_cache_depth'] = 0
     t_end = time.time()
     msg_search['duration_process'] = int(t_end - t_start)
 
@@ -172,10 +300,66 @@ def job_search(msg_search):
     __search(dataset, feature_names, solution, pipe_transform, pipe_model, model, msg_search, ds)
 
 
+def __load_dataset(dataset_id):
+    """
+    loads the dataset, its specific metric and its eval set, or reuses them from the cache of the worker when the
+    version of the dataset has not changed
+
+    :param dataset_id: id of the dataset
+    :return: dataset, eval set, version of the dataset
+    """
+    version = get_dataset_version(dataset_id)
+    entry = __datasets_cache.pop(dataset_id, None)
+    if entry is None or entry[0] != version:
+        dataset = get_dataset(dataset_id)
+        metrics = apply_specific_metrics(dataset_id) if dataset.metric == 'specific' else None
+        ds = get_eval_sets(dataset_id)
+        entry = (version, dataset, ds, metrics, __eval_set_size(ds))
+    else:
+        log.info('dataset %s loaded from cache' % dataset_id)
+        if entry[3] is not None:
+            set_specific_metrics(entry[3])
+
+    # the most recently used datasets are kept within the memory budget
+    if entry[4] <= __worker_cache_size:
+        __datasets_cache[dataset_id] = entry
+        while sum([e[4] for e in __datasets_cache.values()]) > __worker_cache_size:
+            __datasets_cache.popitem(last=False)
+    return entry[1], entry[2], entry[0]
+
+
+def __eval_set_size(ds):
+    # size in memory of the data owned by the process in an eval set (the memory-mapped data are shared)
+    size = 0
+    for x in ds.__dict__.values():
+        if isinstance(x, pd.DataFrame):
+            size += x.index.memory_usage() + sum([__column_size(x.iloc[:, i]) for i in range(len(x.columns))])
+        elif isinstance(x, np.ndarray):
+            size += __array_size(x)
+    return size
+
+
+def __column_size(x):
+    # size of a column: codes and categories of a categorical column, or values
+    if isinstance(x.dtype, pd.CategoricalDtype):
+        return __array_size(x.array.codes) + x.cat.categories.memory_usage(deep=True)
+    return x.memory_usage(index=False, deep=True) if x.dtype == object else __array_size(x.values)
+
+
+def __array_size(x):
+    # size of an array, or 0 if the array is memory-mapped
+    base = x
+    while base is not None:
+        if isinstance(base, mmap.mmap):
+            return 0
+        base = getattr(base, 'base', None)
+    return x.nbytes
+
+
 def make_model(dataset, msg_search, ds_ini):
 
     # pre-processing
-    feature_names, ds, pipe = __pre_processing(dataset, msg_search['pipeline'], deepcopy(ds_ini))
+    feature_names, ds, pipe = __pre_processing(dataset, msg_search['pipeline'], copy_eval_set(ds_ini))
 
     # generate model from solution
     solution = model_solutions_map[msg_search['solution']]
@@ -191,6 +375,37 @@ def make_model(dataset, msg_search, ds_ini):
     return pipe_model
 
 
+def __cached_pre_processing(dataset, version, pipeline, ds_ini):
+    """
+    performs the pre-processing steps, or loads their result when the same pipeline has been executed in a previous
+    round and stored in the cache of the dataset
+
+    only the result of the complete pipeline is stored, by the background writer: the pipelines are mostly sampled
+    again as a whole (with the best pre-processing), and a write per step would delay the round
+
+    :param dataset: dataset object
+    :param version: version of the dataset
+    :param pipeline: pre-processing steps
+    :param ds_ini: eval set
+    :return: feature names, pre-processed eval set, fitted transformers, number of steps reused from the cache
+    """
+    ds = copy_eval_set(ds_ini)
+    if get_config()['pp_cache'] <= 0:
+        return __pre_processing(dataset, pipeline, ds) + (0,)
+    steps = [step for step in pipeline if step[1] != 'sampling']
+    cached = get_pp_cache(dataset.dataset_id, version, steps)
+    if cached is not None:
+        log.info('pre-processing: %d steps loaded from cache' % len(steps))
+        feature_names, ds.X_train, ds.X_test, ds.X, ds.X_submit, pipe = cached
+        return feature_names, ds, list(pipe), len(steps)
+
+    feature_names, ds, pipe = __pre_processing(dataset, steps, ds)
+    # the transformers are copied, as they are fitted again in the search while the writer pickles them
+    __write_artifacts(set_pp_cache, dataset.dataset_id, version, steps,
+                      (feature_names, ds.X_train, ds.X_test, ds.X, ds.X_submit, deepcopy(pipe)))
+    return feature_names, ds, pipe, 0
+
+
 def __pre_processing(dataset, pipeline, ds):
     # performs the different pre-processing steps
     pipe = []
@@ -223,10 +438,12 @@ def __search(dataset, feature_names, solution, pipe_transform, pipe_model, model
     round_id = msg_search['round_id']
     level = msg_search['level']
     threshold = msg_search['threshold']
+    prune = msg_search.get('prune', [])
     pct = msg_search['pct']
     cv = msg_search['cv']
 
-    outlier, y_pred_eval_list, y_pred_test, y_pred_submit, ds = __cross_validation(solution, model, dataset, ds, threshold, pct, cv)
+    stop, y_pred_eval_list, y_pred_test, y_pred_submit, ds = __cross_validation(solution, model, dataset, ds, threshold,
+                                                                               prune, pct, cv)
 
     if hasattr(model, 'num_rounds'):
         msg_search['num_rounds'] = model.num_rounds
@@ -236,47 +453,125 @@ def __search(dataset, feature_names, solution, pipe_transform, pipe_model, model
         msg_search['num_rounds'] = None
 
     # check outlier
-    if outlier:
+    if stop == 'outlier':
         log.info('outlier, skipping this round')
         return
-
-    # save model importance
-    if level == 2 and solution.is_wrapper:
-        __save_importance(model.model, dataset, feature_names, round_id)
-    else:
-        __save_importance(model, dataset, feature_names, round_id)
+    elif stop == 'pruned':
+        # partial result on the first folds
+        msg_search['duration_model'] = int(time.time() - t_start)
+        __evaluate_pruned(msg_search, y_pred_eval_list)
+        return
 
     # create eval and submit results
     y_pred_eval = __create_eval_submit(dataset, ds, round_id, y_pred_eval_list, y_pred_submit, cv)
 
-    # save predictions (eval and test set)
-    pickle.dump([y_pred_eval, y_pred_test, y_pred_submit],
-                open(get_dataset_folder(dataset.dataset_id) + '/predict/%s.pkl' % round_id, 'wb'))
-
-    # then feature names
-    pickle.dump(ds.X_train.columns, open(
-        get_dataset_folder(dataset.dataset_id) + '/models/' + '%s_feature_names.pkl' % msg_search['round_id'], 'wb'))
-
-    # generate graphs
-    __create_graphs(dataset, round_id, ds, y_pred_eval, y_pred_test)
+    # save predictions (eval and test set): used by the ensembles as soon as the result is sent
+    set_pred_eval_test(dataset.dataset_id, round_id, y_pred_eval, y_pred_test, y_pred_submit,
+                       [len(ds.X_train), len(ds.X_test), len(ds.X_submit)])
 
     t_end = time.time()
     msg_search['duration_model'] = int(t_end - t_start)
 
-    # calculate metrics
+    # calculate metrics and send the result
     __evaluate_round(dataset, msg_search, ds.y_train, y_pred_eval, ds.y_test, y_pred_test, ds.y_eval_list,
                      y_pred_eval_list)
 
+    # then the other artifacts are written in the background (the rank of the round is checked now, against the best
+    # models when the result is sent, and not when the writer reaches the round)
+    save_model = __in_model_rank(dataset, msg_search)
+    __write_artifacts(__save_artifacts, dataset, msg_search, solution, feature_names, ds.X_train.columns,
+                      ds.y_train, y_pred_eval, ds.y_test, y_pred_test, pipe_transform, pipe_model, model, save_model)
+
+
+def __save_artifacts(dataset, msg_search, solution, feature_names, columns, y_train, y_pred_eval, y_test,
+                     y_pred_test, pipe_transform, pipe_model, model, save_model):
+    # saves the artifacts of a round which are not required by the search
+    round_id = msg_search['round_id']
+    if msg_search['level'] == 2 and solution.is_wrapper:
+        __save_importance(model.model, dataset, feature_names, round_id)
+    else:
+        __save_importance(model, dataset, feature_names, round_id)
+
+    # feature names
+    pickle.dump(columns, open(get_dataset_folder(dataset.dataset_id) + '/models/%s_feature_names.pkl' % round_id, 'wb'))
+
+    # the graphs are rendered on demand from the predictions: only the confusion matrix is saved
+    if dataset.problem_type == 'classification':
+        create_cnf_matrix(dataset, round_id, y_train, y_pred_eval, 'eval')
+        create_cnf_matrix(dataset, round_id, y_test, y_pred_test, 'test')
+
     # then save model, pipe
-    __save_model(dataset, round_id, pipe_transform, pipe_model, model)
+    if save_model:
+        __save_model(dataset, round_id, pipe_transform, pipe_model, model)
 
     # explain model
-    __explain_model(dataset, msg_search['round_id'], pipe_model, model, feature_names)
+    __explain_model(dataset, round_id, pipe_model, model, feature_names)
+
+
+def __in_model_rank(dataset, msg_search):
+    # checks if the round is in the first ranks of the leaderboard (best per model, including the model of the round),
+    # where the models are saved
+    rank = get_config()['model_rank']
+    if rank <= 0:
+        return True
+    better = [b for b in get_best_models(dataset.dataset_id) if b['cv_mean'] < msg_search['cv_mean']]
+    return len(better) < rank
+
 
+def __start_artifacts_writer():
+    """
+    starts the background thread writing the artifacts of the rounds
+
+    :return:
+    """
+    global __artifacts
+    if __artifacts is None:
+        __artifacts = queue.Queue(ARTIFACTS_QUEUE)
+        threading.Thread(target=__artifacts_writer, daemon=True).start()
+        atexit.register(__flush_artifacts)
 
-def __cross_validation(solution, model, dataset, ds, threshold, pct, cv):
+
+def __artifacts_writer():
+    # background writer: executes the write requests in order (one at a time, as the graphs are not thread safe)
+    while True:
+        f, args = __artifacts.get()
+        try:
+            f(*args)
+        except Exception as e:
+            log.error('error writing artifacts: %s' % e)
+        finally:
+            __artifacts.task_done()
+
+
+def __write_artifacts(f, *args):
+    """
+    writes artifacts in the background writer, or directly when the writer is not started: waits when the queue is
+    full, so that the worker does not get ahead of the writer
+
+    :param f: function writing the artifacts
+    :param args: arguments of the function
+    :return:
+    """
+    if __artifacts is None:
+        f(*args)
+    else:
+        __artifacts.put((f, args))
+
+
+def __flush_artifacts():
+    # waits until all the artifacts are written
+    if __artifacts is not None:
+        __artifacts.join()
+
+
+def __cross_validation(solution, model, dataset, ds, threshold, prune, pct, cv):
     # performs a cross validation on cv_folds, and predict also on X_test
-    y_pred_eval, y_pred_test, y_pred_submit = [], [], []
+    # (stopped as outlier, or pruned with the scores of the folds instead of the predictions)
+    n_cpus = get_config()['worker_cpus']
+    if cv and n_cpus > 1 and not solution.is_wrapper and __pool_context() is not None:
+        return __parallel_cross_validation(solution, model, dataset, ds, threshold, prune, pct, n_cpus)
+
+    y_pred_eval, y_pred_test, y_pred_submit, scores = [], [], [], []
     for i, (train_index, eval_index) in enumerate(ds.cv_folds):
         # use only a percentage of data (default is 100% )
         train_index1 = train_index[:int(len(train_index)*pct)]
@@ -285,18 +580,21 @@ def __cross_validation(solution, model, dataset, ds, threshold, pct, cv):
         if i == 0 and solution.use_early_stopping:
             log.info('early stopping round')
             if __fit_early_stopping(solution, model, dataset, threshold, X1, y1, X2, y2):
-                return True, 0, 0, 0, ds
+                return 'outlier', 0, 0, 0, ds
 
         # then train on train set and predict on eval set
         model.fit(X1, y1)
         y_pred = __predict(solution, model, X2)
 
-        if threshold != 0:
-            # test outlier:
+        if threshold != 0 or len(prune) > 0:
+            # test outlier and pruning:
             score = __evaluate_metric(dataset, y2, y_pred)
-            if score > threshold:
+            if threshold != 0 and score > threshold:
                 log.info('%dth round found outlier: %.5f with threshold %.5f' % (i, score, threshold))
-                return True, 0, 0, 0, ds
+                return 'outlier', 0, 0, 0, ds
+            scores.append(score)
+            if __prune_folds(scores, prune):
+                return 'pruned', scores, 0, 0, ds
 
         y_pred_eval.append(y_pred)
 
@@ -310,8 +608,25 @@ def __cross_validation(solution, model, dataset, ds, threshold, pct, cv):
                 y_pred_submit = __predict(solution, model, ds.X_submit)
             # update y_train on fold, in order to compute metrics and graphs
             ds.y_train = y2
-            return False, y_pred_eval, y_pred_test, y_pred_submit, ds
+            return '', y_pred_eval, y_pred_test, y_pred_submit, ds
+
+    y_pred_test, y_pred_submit = __refit(solution, model, dataset, ds, y_pred_test)
+    return '', y_pred_eval, y_pred_test, y_pred_submit, ds
+
+
+def __prune_folds(scores, prune):
+    # checks if the round is to be stopped after the last fold evaluated (see prune_folds)
+    if prune_folds(scores, prune):
+        i = len(scores) - 1
+        log.info('%dth fold pruned: %.5f with threshold %.5f' % (i, np.mean(scores), prune[i]))
+        return True
+    return False
+
 
+def __refit(solution, model, dataset, ds, y_pred_test_list):
+    # final fit of the model after the cross validation, and predictions on test & submit set
+    # (in competition mode, the prediction on test is the mean of the folds, if available)
+    y_pred_submit = []
     if dataset.mode == 'standard':
         # train on complete train set
         model.fit(ds.X_train, ds.y_train)
@@ -322,11 +637,115 @@ def __cross_validation(solution, model, dataset, ds, threshold, pct, cv):
         if dataset.mode == 'competition':
             y_pred_submit = __predict(solution, model, ds.X_submit)
             # test = mean of y_pred_test on multiple folds
-            y_pred_test = np.mean(y_pred_test, axis=0)
+            y_pred_test = None if y_pred_test_list is None else np.mean(y_pred_test_list, axis=0)
         else:
             y_pred_test = __predict(solution, model, ds.X_test)
+    return y_pred_test, y_pred_submit
 
-    return False, y_pred_eval, y_pred_test, y_pred_submit, ds
+
+def __parallel_cross_validation(solution, model, dataset, ds, threshold, prune, pct, n_cpus):
+    """
+    performs the cross validation with the folds fitted in parallel in a pool of processes
+
+    the processes are forked by a fork server without threads (the worker has threads: timer, artifacts writer), and
+    receive the pre-processed data once when they start; the final fit of the model is executed in the worker at the
+    same time, when there is no threshold to check and no pruning
+
+    :param solution: model solution
+    :param model: model to fit
+    :param dataset: dataset object
+    :param ds: pre-processed data
+    :param threshold: threshold on the score of a fold for outliers (0 = no threshold)
+    :param prune: thresholds on the mean score per fold (empty = no pruning)
+    :param pct: percentage of the train set to use in each fold
+    :param n_cpus: number of processors for the worker
+    :return: stop ('outlier', 'pruned' or ''), predictions on eval folds (scores if pruned), on test and on submit set,
+    data
+    """
+    if solution.use_early_stopping:
+        # early stopping on the 1st fold, before the other folds
+        log.info('early stopping round')
+        train_index, eval_index = ds.cv_folds[0]
+        train_index1 = train_index[:int(len(train_index)*pct)]
+        if __fit_early_stopping(solution, model, dataset, threshold,
+                                ds.X_train.iloc[train_index1], ds.y_train[train_index1],
+                                ds.X_train.iloc[eval_index], ds.y_train[eval_index]):
+            return 'outlier', 0, 0, 0, ds
+
+    n_process = max(1, min(len(ds.cv_folds), n_cpus - 1))
+    log.info('cross validation with %d processes' % n_process)
+    pool = __pool_context().Pool(n_process, initializer=__init_fold,
+                                 initargs=(solution, model, ds.X_train, ds.y_train, ds.X_test, ds.cv_folds, pct))
+    try:
+        # the results are returned in the order of the folds
+        folds = pool.imap(__fit_fold, range(len(ds.cv_folds)))
+        check = threshold != 0 or len(prune) > 0
+        if not check:
+            y_pred_test, y_pred_submit = __refit(solution, model, dataset, ds, None)
+        y_pred_eval, y_pred_test_list, scores = [], [], []
+        for i, (y_pred, y_pred_fold_test) in enumerate(folds):
+            if check:
+                # test outlier and pruning:
+                score = __evaluate_metric(dataset, ds.y_train[ds.cv_folds[i][1]], y_pred)
+                if threshold != 0 and score > threshold:
+                    log.info('%dth round found outlier: %.5f with threshold %.5f' % (i, score, threshold))
+                    return 'outlier', 0, 0, 0, ds
+                scores.append(score)
+                if __prune_folds(scores, prune):
+                    return 'pruned', scores, 0, 0, ds
+            y_pred_eval.append(y_pred)
+            y_pred_test_list.append(y_pred_fold_test)
+    finally:
+        pool.terminate()
+
+    if check:
+        y_pred_test, y_pred_submit = __refit(solution, model, dataset, ds, y_pred_test_list)
+    elif dataset.mode == 'competition':
+        # test = mean of y_pred_test on multiple folds
+        y_pred_test = np.mean(y_pred_test_list, axis=0)
+    return '', y_pred_eval, y_pred_test, y_pred_submit, ds
+
+
+def __init_fold(*args):
+    """
+    initializes a process of the pool of the cross validation
+
+    :param args: model solution, model, X_train, y_train, X_test, cv folds, percentage of the train set
+    :return:
+    """
+    global __fold_context
+    __fold_context = args
+
+
+def __fit_fold(i):
+    """
+    fits a copy of the model on a fold of the cross validation (in a process of the pool)
+
+    :param i: index of the fold
+    :return: predictions on the eval fold and on the test set
+    """
+    solution, model, X_train, y_train, X_test, cv_folds, pct = __fold_context
+    model = deepcopy(model)
+    if hasattr(model, 'get_params'):
+        # one thread per fold
+        threads = [p for p in ['n_jobs', 'nthread', 'num_threads', 'thread_count'] if p in model.get_params()]
+        if len(threads) > 0:
+            model.set_params(**{p: 1 for p in threads})
+    train_index, eval_index = cv_folds[i]
+    train_index1 = train_index[:int(len(train_index)*pct)]
+    model.fit(X_train.iloc[train_index1], y_train[train_index1])
+    return __predict(solution, model, X_train.iloc[eval_index]), __predict(solution, model, X_test)
+
+
+def __pool_context():
+    # multiprocessing context with a fork server, with the modules of the worker already imported (None if not
+    # available, eg. on windows)
+    try:
+        context = multiprocessing.get_context('forkserver')
+    except ValueError:
+        return None
+    context.set_forkserver_preload(['automlk.worker'])
+    return context
 
 
 def __create_stacking(dataset, pool, ds):
@@ -368,6 +787,9 @@ def __create_stacking(dataset, pool, ds):
     ds.X = pd.concat([ds.X_train, ds.X_test])
     ds.y = np.concatenate((ds.y_train, ds.y_test))
 
+    # no coded columns in the predictions
+    ds.coded_cols = {}
+
     return ds
 
 
@@ -402,20 +824,6 @@ def __create_eval_submit(dataset, ds, round_id, y_pred_eval_list, y_pred_submit,
     return y_pred_eval
 
 
-def __create_graphs(dataset, round_id, ds, y_pred_eval, y_pred_test):
-    # generate graphs
-    if dataset.problem_type == 'regression':
-        graph_predict_regression(dataset, round_id, ds.y_train, y_pred_eval, 'eval')
-        graph_predict_regression(dataset, round_id, ds.y_test, y_pred_test, 'test')
-        graph_histogram_regression(dataset, round_id, y_pred_eval, 'eval')
-        graph_histogram_regression(dataset, round_id, y_pred_test, 'test')
-    else:
-        graph_predict_classification(dataset, round_id, ds.y_train, y_pred_eval, 'eval')
-        graph_predict_classification(dataset, round_id, ds.y_test, y_pred_test, 'test')
-        graph_histogram_classification(dataset, round_id, y_pred_eval, 'eval')
-        graph_histogram_classification(dataset, round_id, y_pred_test, 'test')
-
-
 def __fit_early_stopping(solution, model, dataset, threshold, X1, y1, X2, y2):
     # fit with early stopping the model
     if solution.is_wrapper:
@@ -491,10 +899,27 @@ def __evaluate_round(dataset, msg_search, y_train, y_pred_eval, y_test, y_pred_t
     msg_search['test_other_metrics'] = {m: __evaluate_other_metrics(dataset, m, y_test, y_pred_test) for m in
                                         dataset.other_metrics}
 
-    rpush_key_store(RESULTS_QUEUE, msg_search)
+    # the result is sent and the job acknowledged in the same transaction (in redis and sqlite store)
+    with batch_key_store():
+        rpush_key_store(RESULTS_QUEUE, msg_search)
+        __ack_job()
     log.info('completed search')
 
 
+def __evaluate_pruned(msg_search, scores):
+    # partial result of a round stopped after a few folds: the scores on the folds evaluated are sent
+    msg_search['pruned'] = True
+    msg_search['scores_cv'] = scores
+    msg_search['cv_mean'] = np.mean(scores)
+    msg_search['cv_std'] = np.std(scores)
+    msg_search['cv_max'] = np.max(scores)
+
+    with batch_key_store():
+        rpush_key_store(RESULTS_QUEUE, msg_search)
+        __ack_job()
+    log.info('completed search (pruned after %d folds)' % len(scores))
+
+
 def __get_pool_features(dataset, pool):
     # return the lst of features in an ensemble model
     if dataset.problem_type == 'regression':
@@ -530,7 +955,7 @@ def __get_pool_models(dataset, depth):
     log.info('length of pool: %d for ensemble of depth %d' % (len(round_ids), depth))
 
     # retrieves predictions
-    preds = [get_pred_eval_test(dataset.dataset_id, round_id) for round_id in round_ids]
+    preds = get_pred_rounds(dataset.dataset_id, round_ids)
 
     # exclude predictions with nan
     excluded = [i for i, x in enumerate(preds) if not (np.max(x[0]) == np.max(x[0]))]
@@ -586,6 +1011,9 @@ def __save_model(dataset, round_id, pipe_transform, pipe_model, model):
     """
     save model, pipe
 
+    the 3 objects are saved in the same pickle: the model and the pre-processing steps shared by the pipelines are
+    saved once, and shared again when loaded
+
     :param dataset: dataset object
     :param round_id: round id
     :param pipe_transform: sklearn pipeline of pre-processing steps only
@@ -593,10 +1021,14 @@ def __save_model(dataset, round_id, pipe_transform, pipe_model, model):
     :param model: estimator model
     :return:
     """
-    folder = get_dataset_folder(dataset.dataset_id) + '/models/'
-    pickle.dump(model, open(folder + '%s_model.pkl' % round_id, 'wb'))
-    pickle.dump(pipe_model, open(folder + '%s_pipe_model.pkl' % round_id, 'wb'))
-    pickle.dump(pipe_transform, open(folder + '%s_pipe_transform.pkl' % round_id, 'wb'))
+    filename = get_dataset_folder(dataset.dataset_id) + '/models/%s_model_set.pkl' % round_id
+    level = get_config()['model_compress']
+    if level > 0:
+        with gzip.open(filename + '.gz', 'wb', compresslevel=level) as f:
+            pickle.dump((pipe_transform, pipe_model, model), f)
+    else:
+        with open(filename, 'wb') as f:
+            pickle.dump((pipe_transform, pipe_model, model), f)
 
 
 def __explain_model(dataset, round_id, pipe_model, model, feature_names):
@@ -10,16 +10,18 @@ logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)5s [%(mo
                         logging.StreamHandler()
                     ])
 
-logging.info('starting worker')
+# the processes of the parallel cross validation import this module again: the worker is started only in the main one
+if __name__ == '__main__':
+    logging.info('starting worker')
 
-if len(sys.argv) > 1:
-    wid = sys.argv[1]
-else:
-    wid = 1
+    if len(sys.argv) > 1:
+        wid = sys.argv[1]
+    else:
+        wid = 1
 
-if len(sys.argv) > 2:
-    gpu = sys.argv[2]
-else:
-    gpu = False
+    if len(sys.argv) > 2:
+        gpu = sys.argv[2]
+    else:
+        gpu = False
 
-worker_loop(wid, gpu)
+    worker_loop(wid, gpu)
@@ -0,0 +1,60 @@
+import sys
+import time
+import random
+import numpy as np
+import pandas as pd
+from sklearn.model_selection import cross_val_score
+from automlk.solutions import model_solutions_map
+from automlk.spaces.hyper import get_random_params, get_tpe_params
+
+"""
+benchmark of the samplers of the params of the models: tpe vs random, on the bundled datasets
+
+usage: python bench_sampler.py [n_rounds] [n_runs]
+each sampler searches the params of each model during n_rounds (default 50), repeated n_runs times (default 3) with
+different seeds, and the best rmse in cross validation is reported after a number of rounds (mean and standard deviation
+over the runs)
+"""
+
+n_rounds = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+n_runs = int(sys.argv[2]) if len(sys.argv) > 2 else 3
+
+datasets = [('abalone', '../datasets/abalone/train.csv', 'rings'),
+            ('wine', '../datasets/wine/winequality.csv', 'quality')]
+solutions = ['KNN-R', 'RIDGE', 'LASSO', 'XTRA-R', 'RF-R']
+samplers = [('random', lambda space, history: get_random_params(space)),
+            ('tpe', get_tpe_params)]
+checkpoints = [r for r in [10, 20, 50, 100, 200, 500] if r < n_rounds] + [n_rounds]
+
+for name, filename, y_col in datasets:
+    df = pd.read_csv(filename)
+    X = pd.get_dummies(df.drop(y_col, axis=1)).values.astype(np.float64)
+    y = df[y_col].values
+    for ref in solutions:
+        solution = model_solutions_map[ref]
+        print('-' * 60)
+        print('dataset %s, model %s' % (name, solution.name))
+        for sampler_name, sampler in samplers:
+            curves = []
+            t0 = time.time()
+            for run in range(n_runs):
+                random.seed(run)
+                np.random.seed(run)
+                history = []
+                best, curve = np.inf, []
+                for i in range(n_rounds):
+                    params = sampler(solution.space_params, history)
+                    try:
+                        score = np.sqrt(-np.mean(cross_val_score(solution.model(**params), X, y, cv=3,
+                                                                 scoring='neg_mean_squared_error')))
+                    except:
+                        score = np.inf
+                    if np.isfinite(score):
+                        history.append((params, score))
+                    best = min(best, score)
+                    curve.append(best)
+                curves.append(curve)
+            # mean and standard deviation over the runs
+            mean, std = np.mean(curves, axis=0), np.std(curves, axis=0)
+            print('%-8s %s  (%.1f s)' % (sampler_name, '  '.join(['%d: %.4f +- %.4f' % (r, mean[r - 1], std[r - 1])
+                                                                  for r in checkpoints]), time.time() - t0))
@@ -0,0 +1,34 @@
+import sys
+import time
+import json
+import msgpack
+from automlk.store import list_key_store
+
+"""
+benchmark of the encoding of the search rounds in the store: json vs msgpack
+
+usage: python bench_store_codec.py dataset_id [n_rounds]
+the history of the dataset is repeated up to n_rounds (default 5000)
+"""
+
+dataset_id = sys.argv[1]
+n_rounds = int(sys.argv[2]) if len(sys.argv) > 2 else 5000
+
+rounds = list_key_store('dataset:%s:rounds' % dataset_id)
+if len(rounds) == 0:
+    raise ValueError('no search rounds for dataset %s' % dataset_id)
+rounds = [rounds[i % len(rounds)] for i in range(n_rounds)]
+print('dataset %s: %d rounds' % (dataset_id, len(rounds)))
+
+codecs = [('json', lambda x: json.dumps(x).encode(), lambda x: json.loads(x)),
+          ('msgpack', lambda x: msgpack.packb(x, use_bin_type=True),
+           lambda x: msgpack.unpackb(x, raw=False, strict_map_key=False))]
+
+for name, encode, decode in codecs:
+    t0 = time.perf_counter()
+    raws = [encode(r) for r in rounds]
+    t1 = time.perf_counter()
+    values = [decode(r) for r in raws]
+    t2 = time.perf_counter()
+    print('%-8s encode: %7.1f ms  decode: %7.1f ms  size: %8.1f KB' %
+          (name, 1000 * (t1 - t0), 1000 * (t2 - t1), sum([len(r) for r in raws]) / 1024))
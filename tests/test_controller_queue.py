@@ -0,0 +1,35 @@
+import uuid
+from automlk.config import SEARCH_QUEUE
+from automlk.store import lpush_key_store, rpop_key_store, del_key_store, list_key_store
+import automlk.controller as controller
+
+
+def test_forget_taken_jobs():
+    # the jobs taken by the workers are forgotten, the search queue being read only when it is shorter
+    queued = getattr(controller, '__queued')
+    forget = getattr(controller, '__forget_taken_jobs')
+    saved = list_key_store(SEARCH_QUEUE)
+    del_key_store(SEARCH_QUEUE)
+    dataset_id = 'test_%s' % uuid.uuid4().hex
+    try:
+        for round_id in range(3):
+            job = {'dataset_id': dataset_id, 'round_id': round_id}
+            lpush_key_store(SEARCH_QUEUE, job)
+            queued.setdefault(dataset_id, {})[round_id] = job
+        forget(3)
+        assert len(queued[dataset_id]) == 3
+        taken = rpop_key_store(SEARCH_QUEUE)
+        forget(2)
+        assert sorted(queued[dataset_id].keys()) == sorted({0, 1, 2} - {taken['round_id']})
+        forget(0)
+        assert dataset_id not in queued
+    finally:
+        queued.pop(dataset_id, None)
+        del_key_store(SEARCH_QUEUE)
+        for job in saved:
+            lpush_key_store(SEARCH_QUEUE, job)
+
+
+if __name__ == '__main__':
+    test_forget_taken_jobs()
+    print('ok')
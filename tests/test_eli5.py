@@ -4,6 +4,7 @@ import pandas as pd
 from eli5.sklearn import PermutationImportance
 from automlk.context import get_dataset_folder
 from automlk.dataset import get_dataset, get_dataset_sample
+from automlk.results import get_round_model
 
 
 dataset_id = '37'
@@ -17,9 +18,7 @@ folder = get_dataset_folder(dataset_id) + '/models/'
 names = list(pickle.load(open(folder + '%s_feature_names.pkl' % round_id, 'rb')))
 print(names)
 
-model = pickle.load(open(folder + '%s_model.pkl' % round_id, 'rb'))
-pipe_model = pickle.load(open(folder + '%s_pipe_model.pkl' % round_id, 'rb'))
-pipe_transform = pickle.load(open(folder + '%s_pipe_transform.pkl' % round_id, 'rb'))
+pipe_transform, pipe_model, model = get_round_model(dataset_id, round_id)
 
 sample = get_dataset_sample(dataset_id)
 
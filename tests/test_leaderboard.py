@@ -0,0 +1,172 @@
+from automlk.config import METRIC_NULL
+from automlk.leaderboard import Leaderboard, SuccessiveHalving, config_key, N_CV_SELECT, HALVING_RUNGS
+
+
+def result(round_id, score, cv=True, model='LGBM', level=1, scores_cv=None, **kwargs):
+    # result message of a round
+    msg = {'round_id': round_id, 'model_name': model, 'solution': model, 'level': level, 'mode': 'search',
+           'cv': cv, 'cv_mean': score, 'cv_max': score, 'model_params': {'round': round_id}, 'pipeline': [],
+           'pct': 1., 'scores_cv': [] if scores_cv is None else scores_cv, 'parent': None}
+    msg.update(kwargs)
+    return msg
+
+
+def test_config_key():
+    # same key for the same configuration, whatever the order of the params
+    a = result(0, 0.5, model_params={'a': 1, 'b': 2})
+    b = result(1, 0.4, model_params={'b': 2, 'a': 1})
+    assert config_key(a) == config_key(b)
+    assert config_key(a) != config_key(result(2, 0.5, model_params={'a': 1, 'b': 3}))
+    assert config_key(a) != config_key(result(3, 0.5, model_params={'a': 1, 'b': 2}, pct=0.5))
+
+
+def test_best():
+    # best score and round on the results with cv only
+    lb = Leaderboard()
+    lb.add(result(0, 0.5))
+    lb.add(result(1, 0.1, cv=False))
+    lb.add(result(2, 0.3))
+    lb.add(result(3, 0.4))
+    assert (lb.n, lb.n_cv) == (4, 3)
+    assert (lb.best_score, lb.best_round) == (0.3, 2)
+
+
+def test_best_models():
+    # best result per model, on the results with cv when there are enough
+    lb = Leaderboard()
+    lb.add(result(0, 0.1, cv=False, model='A'))
+    for i in range(N_CV_SELECT + 1):
+        lb.add(result(i + 1, 0.5 - i / 100, model='B'))
+    models = lb.best_models()
+    assert [m['model_name'] for m in models] == ['B']
+    assert models[0]['cv_mean'] == 0.5 - N_CV_SELECT / 100
+    assert models[0]['searches'] == N_CV_SELECT + 1
+
+
+def test_changed():
+    # the best results changed in the selection of the leaderboard, and the numbers of searches apart
+    lb = Leaderboard()
+    assert lb.add(result(0, 0.5, model='A', pipeline=[('FR-1', 'float', 'scaling', {})])) == {'models', 'pp'}
+    assert lb.add(result(1, 0.6, model='A', pipeline=[('FR-1', 'float', 'scaling', {})])) == set()
+    assert lb.add(result(2, 0.4, model='A', pipeline=[('FR-2', 'float', 'scaling', {})])) == {'models', 'pp'}
+    assert lb.add(result(3, 0.7, model='A', pipeline=[('FR-3', 'float', 'scaling', {})])) == {'pp'}
+    assert lb.search_counts() == {'models': {'A': 4}, 'pp': {'float': {'FR-1': 2, 'FR-2': 1, 'FR-3': 1}}}
+    assert [r['searches'] for r in lb.best_models()] == [4]
+
+
+def test_scan():
+    # the scan results are kept for the scan graph
+    lb = Leaderboard()
+    lb.add(result(0, 0.5, mode='scan', pct=0.2))
+    lb.add(result(1, 0.4))
+    assert lb.scan == [{'model_name': 'LGBM', 'solution': 'LGBM', 'pct': 0.2, 'cv_mean': 0.5}]
+
+
+def test_configs():
+    # configurations evaluated, sent and pruned
+    lb = Leaderboard()
+    msg = result(0, 0.5)
+    key = config_key(msg)
+    assert lb.is_new(key)
+    lb.sent(key)
+    assert not lb.is_new(key)
+    lb.add(msg)
+    assert not lb.is_new(key)
+    assert lb.configs[key] == (0, 0.5)
+    assert len(lb.in_progress) == 0
+    pruned = result(1, 0.9)
+    lb.add_pruned(pruned)
+    assert lb.n_pruned == 1 and lb.n == 1
+    assert not lb.is_new(config_key(pruned))
+
+
+def test_round_ids():
+    # rounds with a result, complete or pruned (a second result of the same round is rejected by the controller)
+    lb = Leaderboard()
+    lb.add(result(0, 0.5))
+    lb.add_pruned(result(1, 0.9))
+    assert lb.round_ids == {0, 1}
+    assert 2 not in lb.round_ids
+
+
+def test_stall():
+    # number of results with cv at a level since its best score
+    lb = Leaderboard()
+    assert lb.stall(2) == 0
+    lb.add(result(0, 0.5, level=2))
+    lb.add(result(1, 0.6, level=2))
+    lb.add(result(2, 0.7, level=2))
+    lb.add(result(3, 0.9, cv=False, level=2))
+    assert lb.stall(2) == 2
+    lb.add_pruned(result(4, 0.8, level=2))
+    assert lb.stall(2) == 3
+    lb.add(result(5, 0.4, level=2))
+    assert lb.stall(2) == 0
+    assert lb.stall(1) == 0
+
+
+def test_fold_thresholds():
+    # worst mean score on the first folds among the k best results
+    lb = Leaderboard()
+    assert lb.fold_thresholds(1, 2) == []
+    lb.add(result(0, 0.3, scores_cv=[0.2, 0.4]))
+    assert lb.fold_thresholds(1, 2) == []
+    lb.add(result(1, 0.5, scores_cv=[0.6, 0.4]))
+    lb.add(result(2, 0.9, scores_cv=[0.9, 0.9]))
+    assert [round(x, 6) for x in lb.fold_thresholds(1, 2)] == [0.6, 0.5]
+    assert [round(x, 6) for x in lb.fold_thresholds(1, 1)] == [0.2, 0.3]
+    assert lb.fold_thresholds(1, 0) == []
+    assert lb.fold_thresholds(2, 1) == []
+
+
+def test_halving():
+    # the best results of a rung are promoted once to the next rung
+    sh = SuccessiveHalving(3)
+    assert sh.budget(HALVING_RUNGS - 1) == (1., True)
+    assert sh.budget(0) == (1. / 9, False)
+
+    def halving(round_id, score, rung, parent=None):
+        return result(round_id, score, cv=rung == HALVING_RUNGS - 1, mode='halving', rung=rung, parent=parent)
+
+    sh.add(halving(0, 0.5, 0))
+    sh.add(halving(1, 0.4, 0))
+    assert sh.next_promotion() is None
+    sh.add(halving(2, 0.6, 0))
+    assert sh.next_promotion()['round_id'] == 1
+    assert sh.next_promotion() is None
+    for i in range(3, 6):
+        sh.add(halving(i, 0.7 + i / 100, 0))
+    assert sh.next_promotion()['round_id'] == 0
+    # results without score are not promoted
+    sh.add(halving(6, METRIC_NULL, 0))
+    assert sh.next_promotion() is None
+
+
+def test_halving_dispatched():
+    # a configuration already sent on the next rung is not promoted again (eg. after a rebuild)
+    lb = Leaderboard(halving=3)
+    lb.halving.dispatched(1)
+    for i, score in enumerate([0.5, 0.4, 0.6]):
+        lb.add(result(i, score, cv=False, mode='halving', rung=0))
+    assert lb.halving.next_promotion() is None
+    # the result on the next rung marks its parent as promoted
+    lb = Leaderboard(halving=3)
+    for i, score in enumerate([0.5, 0.4, 0.6]):
+        lb.add(result(i, score, cv=False, mode='halving', rung=0))
+    lb.add(result(3, 0.3, cv=False, mode='halving', rung=1, parent=1))
+    assert lb.halving.next_promotion() is None
+
+
+if __name__ == '__main__':
+    test_config_key()
+    test_best()
+    test_best_models()
+    test_changed()
+    test_scan()
+    test_configs()
+    test_round_ids()
+    test_stall()
+    test_fold_thresholds()
+    test_halving()
+    test_halving_dispatched()
+    print('ok')
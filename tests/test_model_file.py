@@ -0,0 +1,27 @@
+import os
+import uuid
+import pickle
+import shutil
+from automlk.context import get_dataset_folder
+from automlk.results import create_model_file
+
+
+def test_model_file():
+    # the file of a model is created only when the model of the round has been saved
+    dataset_id = 'test_%s' % uuid.uuid4().hex
+    folder = get_dataset_folder(dataset_id) + '/models'
+    os.makedirs(folder)
+    try:
+        assert create_model_file(dataset_id, 1, 'model') is None
+        assert os.listdir(folder) == []
+        with open(folder + '/2_model_set.pkl', 'wb') as f:
+            pickle.dump(('transform', 'pipe', 'model'), f)
+        filename = create_model_file(dataset_id, 2, 'model')
+        assert pickle.load(open(filename, 'rb')) == 'model'
+    finally:
+        shutil.rmtree(get_dataset_folder(dataset_id))
+
+
+if __name__ == '__main__':
+    test_model_file()
+    print('ok')
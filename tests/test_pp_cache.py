@@ -0,0 +1,50 @@
+import os
+import types
+import uuid
+import shutil
+import numpy as np
+import pandas as pd
+from automlk.context import get_config, get_dataset_folder
+from automlk.pp_cache import pp_cache_key
+import automlk.worker as worker
+
+
+def cached_pre_processing(dataset, pipeline):
+    # pre-processing of the worker on a small eval set
+    X = pd.DataFrame({'a': np.arange(20.), 'b': np.arange(20.) ** 2})
+    y = np.arange(20.)
+    ds = types.SimpleNamespace(X_train=X.iloc[:10], y_train=y[:10], X_test=X.iloc[10:], y_test=y[10:], X=X, y=y,
+                               X_submit=X.iloc[:0], cv_folds=[])
+    return getattr(worker, '__cached_pre_processing')(dataset, 'v1', pipeline, ds)
+
+
+def test_cached_pre_processing():
+    # only the result of the complete pipeline is stored, and reused by the same pipeline
+    if get_config()['pp_cache'] <= 0:
+        return
+    features = [types.SimpleNamespace(name=c, col_type='numerical', raw_type='float64', n_missing=0,
+                                      n_unique_values=20, text_ref='') for c in ['a', 'b']]
+    dataset = types.SimpleNamespace(dataset_id='test_pp_%s' % uuid.uuid4().hex, features=features, x_cols=['a', 'b'])
+    pipeline = [('SC-STD', 'scaling', 'Scaling Standard', {}), ('FR-PASS', 'feature', 'No Feature selection', {})]
+    try:
+        _, ds, pipe, depth = cached_pre_processing(dataset, pipeline)
+        assert depth == 0 and len(pipe) == 2
+        folder = get_dataset_folder(dataset.dataset_id) + '/cache'
+        assert os.listdir(folder) == ['%s.pkl' % pp_cache_key('v1', pipeline)]
+
+        _, ds2, pipe2, depth = cached_pre_processing(dataset, pipeline)
+        assert depth == 2 and len(pipe2) == 2
+        assert np.allclose(ds.X_train.values, ds2.X_train.values)
+
+        # a pipeline starting with the same steps is executed completely
+        other = pipeline[:1] + [('SC-MINMAX', 'scaling', 'Scaling MinMax', {})]
+        _, _, _, depth = cached_pre_processing(dataset, other)
+        assert depth == 0
+        assert len(os.listdir(folder)) == 2
+    finally:
+        shutil.rmtree(get_dataset_folder(dataset.dataset_id))
+
+
+if __name__ == '__main__':
+    test_cached_pre_processing()
+    print('ok')
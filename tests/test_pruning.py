@@ -0,0 +1,99 @@
+import random
+import types
+import numpy as np
+import pandas as pd
+from automlk.leaderboard import Leaderboard, prune_folds, PRUNE_Z
+from automlk.spaces.hyper import HyperChoice, get_tpe_params, TPE_STARTUP
+import automlk.worker as worker
+
+
+class OffsetModel(object):
+    # model predicting the first column of X with an offset per fit, ie. a score of abs(offset) in rmse
+
+    def __init__(self, offsets):
+        self.offsets = offsets
+        self.n_fit = 0
+
+    def fit(self, X, y):
+        self.n_fit += 1
+        return self
+
+    def predict(self, X):
+        return X.iloc[:, 0].values + self.offsets[self.n_fit - 1]
+
+
+def cross_validation(offsets, prune):
+    # cross validation of the worker on 5 folds, where the first column of X is y
+    y = np.arange(100.)
+    X = pd.DataFrame({'y': y})
+    folds = [(np.array([i for i in range(100) if i % 5 != k]), np.arange(k, 100, 5)) for k in range(5)]
+    ds = types.SimpleNamespace(X_train=X, y_train=y, X_test=X.iloc[:10], y_test=y[:10], X=X, y=y, X_submit=X.iloc[:0],
+                               cv_folds=folds)
+    dataset = types.SimpleNamespace(metric='rmse', y_n_classes=0, best_is_min=True, mode='standard')
+    solution = types.SimpleNamespace(problem_type='regression', use_early_stopping=False, is_wrapper=False)
+    model = OffsetModel(offsets + [0])
+    return getattr(worker, '__cross_validation')(solution, model, dataset, ds, 0, prune, 1., True)
+
+
+def test_prune_folds():
+    # at least 2 folds, and a mean worse than the threshold by more than PRUNE_Z standard errors
+    prune = [0.1, 0.2, 0.3, 0.4, 0.5]
+    assert not prune_folds([0.9], prune)
+    assert prune_folds([0.5, 0.6], prune)
+    assert not prune_folds([0.5, 0.6], [])
+    assert not prune_folds([0.1, 0.9], prune)
+    margin = PRUNE_Z * np.std([0.1, 0.3], ddof=1) / np.sqrt(2)
+    assert prune_folds([0.1, 0.3], [0, 0.2 - margin - 0.01])
+    assert not prune_folds([0.1, 0.3], [0, 0.2 - margin + 0.01])
+
+
+def test_cross_validation_pruned():
+    # the round is stopped at the first fold where the mean score is out of the thresholds
+    stop, scores, _, _, _ = cross_validation([0.1, 0.1, 0.9, 0.9, 0.9], [0.2, 0.2, 0.2, 0.2, 0.2])
+    assert stop == 'pruned'
+    assert [round(s, 6) for s in scores] == [0.1, 0.1, 0.9, 0.9]
+
+
+def test_cross_validation_complete():
+    # no pruning within the thresholds, or without thresholds
+    for prune in [[0.5] * 5, []]:
+        stop, y_pred_eval, _, _, _ = cross_validation([0.1, 0.2, 0.1, 0.2, 0.1], prune)
+        assert stop == ''
+        assert len(y_pred_eval) == 5
+
+
+def test_thresholds_from_leaderboard():
+    # thresholds of the leaderboard with the scores of the folds of the best results
+    lb = Leaderboard()
+    lb.add({'round_id': 0, 'model_name': 'M', 'solution': 'M', 'level': 1, 'mode': 'search', 'cv': True,
+            'cv_mean': 0.2, 'cv_max': 0.3, 'model_params': {}, 'pipeline': [], 'pct': 1.,
+            'scores_cv': [0.1, 0.3, 0.2, 0.2, 0.2]})
+    prune = lb.fold_thresholds(1, 1)
+    stop, scores, _, _, _ = cross_validation([0.4, 0.4, 0.4, 0.4, 0.4], prune)
+    assert stop == 'pruned' and len(scores) == 2
+
+
+def test_pruned_history():
+    # the params of the pruned rounds are always in the bad results of the sampler
+    lb = Leaderboard()
+    space = {'x': HyperChoice(list(range(10)))}
+    for i in range(TPE_STARTUP * 2):
+        lb.add_pruned({'round_id': i, 'solution': 'M', 'model_params': {'x': 0}, 'pipeline': [], 'pct': 1.,
+                       'cv': True, 'cv_mean': 0., 'level': 1})
+    for i in range(TPE_STARTUP):
+        lb.add({'round_id': 100 + i, 'model_name': 'M', 'solution': 'M', 'level': 1, 'mode': 'search', 'cv': True,
+                'cv_mean': 1. + i, 'cv_max': 1. + i, 'model_params': {'x': 1 + i % 9}, 'pipeline': [], 'pct': 1.,
+                'scores_cv': []})
+    assert [s for p, s in lb.history('M')].count(None) == TPE_STARTUP * 2
+    random.seed(0)
+    np.random.seed(0)
+    assert [get_tpe_params(space, lb.history('M'))['x'] for i in range(20)].count(0) <= 2
+
+
+if __name__ == '__main__':
+    test_prune_folds()
+    test_cross_validation_pruned()
+    test_cross_validation_complete()
+    test_thresholds_from_leaderboard()
+    test_pruned_history()
+    print('ok')
@@ -0,0 +1,31 @@
+import os
+import uuid
+import types
+import shutil
+from automlk.context import get_dataset_folder
+from automlk.results import graph_round
+
+
+def test_graph_round_themes():
+    # a graph is rendered again when missing in one of the themes (here without predictions: the rendering fails)
+    dataset = types.SimpleNamespace(dataset_id='test_%s' % uuid.uuid4().hex, problem_type='regression')
+    folder = get_dataset_folder(dataset.dataset_id)
+    for theme in ['graphs', 'graphs_dark']:
+        os.makedirs(folder + '/' + theme)
+    try:
+        open(folder + '/graphs/predict_eval_1.png', 'wb').close()
+        try:
+            graph_round(dataset, 1, [('predict', 'eval')])
+            rendered = False
+        except Exception:
+            rendered = True
+        assert rendered
+        open(folder + '/graphs_dark/predict_eval_1.png', 'wb').close()
+        graph_round(dataset, 1, [('predict', 'eval')])
+    finally:
+        shutil.rmtree(folder)
+
+
+if __name__ == '__main__':
+    test_graph_round_themes()
+    print('ok')
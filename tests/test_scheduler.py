@@ -0,0 +1,99 @@
+import random
+from automlk.scheduler import get_round_ids, get_round_origin, get_ensemble_ratio, ADAPTIVE_WINDOW, ADAPTIVE_STEPS
+
+
+def loop_round_ids(round_id, start, ratio):
+    # reference: previous implementation in the controller, counting the rounds of each level since the round 0
+    if round_id < start:
+        return 1, round_id, -1
+    round_id_l1 = -1
+    round_id_l2 = -1
+    for i in range(round_id + 1):
+        if i >= start and i % ratio == 0:
+            round_id_l2 += 1
+        else:
+            round_id_l1 += 1
+    if round_id >= start and round_id % ratio == 0:
+        return 2, round_id_l1, round_id_l2
+    else:
+        return 1, round_id_l1, round_id_l2
+
+
+def test_equivalence():
+    # same result as the loop, on all the rounds of small searches
+    for start in range(0, 30):
+        for ratio in range(1, 8):
+            for round_id in range(200):
+                assert get_round_ids(round_id, start, ratio) == loop_round_ids(round_id, start, ratio), \
+                    (round_id, start, ratio)
+
+
+def test_equivalence_random():
+    # same result as the loop, on random rounds of long searches
+    rnd = random.Random(0)
+    for k in range(300):
+        start, ratio, round_id = rnd.randint(0, 500), rnd.randint(1, 10), rnd.randint(0, 6000)
+        assert get_round_ids(round_id, start, ratio) == loop_round_ids(round_id, start, ratio), (round_id, start, ratio)
+
+
+def test_sequence():
+    # each round takes the next index of its level, and the indices of the other level are unchanged
+    rnd = random.Random(1)
+    for k in range(50):
+        start, ratio = rnd.randint(0, 200), rnd.randint(1, 10)
+        ids = [get_round_ids(round_id, start, ratio) for round_id in range(3000)]
+        for (_, l1_prev, l2_prev), (level, l1, l2) in zip(ids[:-1], ids[1:]):
+            if level == 1:
+                assert (l1, l2) == (l1_prev + 1, l2_prev)
+            else:
+                assert (l1, l2) == (l1_prev, l2_prev + 1)
+        # one round at level 2 every ratio rounds from the start
+        assert len([x for x in ids if x[0] == 2]) == len([i for i in range(start, 3000) if i % ratio == 0])
+
+
+def test_ratio_change():
+    # the indexes continue without jump when the ratio changes during the search (eg. adaptive policy)
+    rnd = random.Random(2)
+    for k in range(50):
+        start, ratio, origin = rnd.randint(0, 200), rnd.randint(1, 4), (0, 0, 0)
+        ids = []
+        for round_id in range(3000):
+            if rnd.random() < 0.01:
+                new_ratio = rnd.choice([0, 1, 2, 4, 8, 16])
+                origin, ratio = get_round_origin(round_id, start, ratio, origin), new_ratio
+            ids.append(get_round_ids(round_id, start, ratio, origin))
+            level = ids[-1][0]
+            assert level == (2 if round_id >= start and ratio > 0 and round_id % ratio == 0 else 1)
+        assert ids[0] in [(1, 0, -1), (2, -1, 0)]
+        for (_, l1_prev, l2_prev), (level, l1, l2) in zip(ids[:-1], ids[1:]):
+            if level == 1:
+                assert (l1, l2) == (l1_prev + 1, l2_prev)
+            else:
+                assert (l1, l2) == (l1_prev, l2_prev + 1)
+
+
+def test_no_ensembles():
+    # ratio 0: all the rounds are at level 1
+    for round_id in range(1000):
+        assert get_round_ids(round_id, 100, 0) == (1, round_id, -1)
+
+
+def test_policy():
+    # fixed ratio, and adaptive ratio increasing without gain of the ensembles
+    for stall in range(0, 200):
+        assert get_ensemble_ratio(2, 'fixed', stall) == 2
+        assert get_ensemble_ratio(0, 'adaptive', stall) == 0
+    assert get_ensemble_ratio(2, 'adaptive', 0) == 2
+    assert get_ensemble_ratio(2, 'adaptive', ADAPTIVE_WINDOW - 1) == 2
+    assert get_ensemble_ratio(2, 'adaptive', ADAPTIVE_WINDOW) == 4
+    assert get_ensemble_ratio(2, 'adaptive', 1000 * ADAPTIVE_WINDOW) == 2 * 2 ** ADAPTIVE_STEPS
+
+
+if __name__ == '__main__':
+    test_equivalence()
+    test_equivalence_random()
+    test_sequence()
+    test_ratio_change()
+    test_no_ensembles()
+    test_policy()
+    print('ok')
@@ -0,0 +1,29 @@
+import uuid
+from automlk.store import rpush_key_store, del_key_store
+import automlk.worker as worker
+from automlk.worker import get_search_rounds, ROUNDS_CACHE_MAX
+
+
+def test_rounds_cache():
+    # the results of the datasets most recently used are kept, with the rounds added since the last call
+    cache = getattr(worker, '__rounds_cache')
+    datasets = ['test_%s' % uuid.uuid4().hex for i in range(ROUNDS_CACHE_MAX + 2)]
+    try:
+        for i, dataset_id in enumerate(datasets):
+            for round_id in range(i + 1):
+                rpush_key_store('dataset:%s:rounds' % dataset_id, {'round_id': round_id, 'cv_mean': 0.5})
+            assert len(get_search_rounds(dataset_id)) == i + 1
+            assert len(cache) <= ROUNDS_CACHE_MAX
+        assert datasets[0] not in cache and datasets[-1] in cache
+        rpush_key_store('dataset:%s:rounds' % datasets[0], {'round_id': 1, 'cv_mean': 0.4})
+        assert list(get_search_rounds(datasets[0]).round_id) == [0, 1]
+        assert datasets[0] in cache and datasets[1] not in cache
+    finally:
+        for dataset_id in datasets:
+            del_key_store('dataset:%s:rounds' % dataset_id)
+            cache.pop(dataset_id, None)
+
+
+if __name__ == '__main__':
+    test_rounds_cache()
+    print('ok')
@@ -0,0 +1,233 @@
+import os
+import uuid
+import time
+from automlk.config import get_use_redis, set_use_sqlite
+from automlk.store import *
+import automlk.store as store
+
+# the file and sqlite stores are both tested on the local data folder, unless the store is redis
+BACKENDS = ['redis'] if get_use_redis() else ['file', 'sqlite']
+
+
+def __backends():
+    # runs the test in each backend, with a new key
+    for backend in BACKENDS:
+        if backend != 'redis':
+            set_use_sqlite(backend == 'sqlite')
+        key = 'test_api:%s' % uuid.uuid4().hex
+        try:
+            yield backend, key
+        finally:
+            del_key_store(key)
+    set_use_sqlite(get_config()['store'] == 'sqlite')
+
+
+def test_list():
+    # push, range, length and removal as in redis
+    for backend, key in __backends():
+        assert list_key_store(key) == [], backend
+        assert llen_key_store(key) == 0, backend
+        for i in range(5):
+            rpush_key_store(key, i)
+        lpush_key_store(key, -1)
+        assert list_key_store(key) == [-1, 0, 1, 2, 3, 4], backend
+        assert llen_key_store(key) == 6, backend
+        assert lrange_key_store(key, 1, 2) == [0, 1], backend
+        assert lrange_key_store(key, -2) == [3, 4], backend
+        assert lrange_key_store(key, 4, 1) == [], backend
+        assert lrem_key_store(key, 2) == 1, backend
+        assert lrem_key_store(key, 10) == 0, backend
+        assert list_key_store(key) == [-1, 0, 1, 3, 4], backend
+
+
+def test_pop():
+    # pop of the first element, and blocking pop with timeout
+    for backend, key in __backends():
+        assert rpop_key_store(key) is None, backend
+        assert brpop_key_store(key, timeout=1) is None, backend
+        rpush_key_store(key, {'a': 1})
+        rpush_key_store(key, {'b': 2})
+        assert brpop_key_store(key, timeout=1) in [{'a': 1}, {'b': 2}], backend
+        assert llen_key_store(key) == 1, backend
+
+
+def test_pop_dest():
+    # blocking pop with the element pushed in another list
+    for backend, key in __backends():
+        dest = key + ':dest'
+        rpush_key_store(key, 'job')
+        assert brpop_key_store(key, timeout=1, dest=dest) == 'job', backend
+        assert list_key_store(key) == [], backend
+        assert list_key_store(dest) == ['job'], backend
+        del_key_store(dest)
+
+
+def test_copies():
+    # the list read is a new list (its values are shared with the cache of the process, and not modified)
+    for backend, key in __backends():
+        rpush_key_store(key, {'scores': [1, 2]})
+        l = list_key_store(key)
+        l.append(None)
+        lrange_key_store(key, 0).append(None)
+        assert list_key_store(key) == [{'scores': [1, 2]}], backend
+
+
+def test_pop_keys():
+    # blocking pop on several lists, in order of priority
+    for backend, key in __backends():
+        other = key + ':other'
+        try:
+            assert brpop_keys_store([key, other], 0.2) is None, backend
+            lpush_key_store(other, 'b')
+            assert brpop_keys_store([key, other], 1) == (other, 'b'), backend
+            lpush_key_store(other, 'b')
+            lpush_key_store(key, 'a')
+            assert brpop_keys_store([key, other], 1) == (key, 'a'), backend
+            assert brpop_keys_store([key, other], 1) == (other, 'b'), backend
+        finally:
+            del_key_store(other)
+
+
+def test_values():
+    # values of all types read as written
+    for backend, key in __backends():
+        for value in [12, 'hello', True, 56.45454, {'a': 1, 'b': [1, 2]}, [1, 'a', None]]:
+            set_key_store(key, value)
+            assert get_key_store(key) == value, (backend, value)
+        rpush_key_store(key + ':list', {'x': [1.5, 'a']})
+        assert list_key_store(key + ':list') == [{'x': [1.5, 'a']}], backend
+        del_key_store(key + ':list')
+
+
+def test_codecs():
+    # the keys of the dictionaries are read as strings and the tuples as lists, as in json, with both codecs
+    value = {1: 'a', 'b': {2.5: [(1, 2)]}, None: True}
+    expected = {'1': 'a', 'b': {'2.5': [[1, 2]]}, 'null': True}
+    codec = getattr(store, '__codec')
+    try:
+        # msgpack is tested when it is the codec of the config
+        for c in ['json'] + (['msgpack'] if hasattr(store, 'msgpack') else []):
+            setattr(store, '__codec', c)
+            for backend, key in __backends():
+                set_key_store(key, value)
+                assert get_key_store(key) == expected, (backend, c)
+                rpush_key_store(key + ':list', value)
+                assert list_key_store(key + ':list') == [expected], (backend, c)
+                del_key_store(key + ':list')
+    finally:
+        setattr(store, '__codec', codec)
+
+
+def test_set():
+    # set api, with an empty set for a missing key
+    for backend, key in __backends():
+        assert smembers_key_store(key) == [], backend
+        assert not sismember_key_store(key, 'a'), backend
+        assert sadd_key_store(key, 'a') == 1, backend
+        assert sadd_key_store(key, 'b') == 1, backend
+        assert sadd_key_store(key, 'a') == 0, backend
+        assert sorted(smembers_key_store(key)) == ['a', 'b'], backend
+        assert sismember_key_store(key, 'b'), backend
+        assert not sismember_key_store(key, 'c'), backend
+
+
+def test_counter():
+    # counters from 0
+    for backend, key in __backends():
+        assert get_counter_store(key) == 0, backend
+        incr_key_store(key)
+        incr_key_store(key, 2)
+        assert get_counter_store(key) == 3, backend
+
+
+def test_delete():
+    # a list is deleted with its files
+    for backend, key in __backends():
+        rpush_key_store(key, 1)
+        assert exists_key_store(key), backend
+        del_key_store(key)
+        assert not exists_key_store(key), backend
+        assert list_key_store(key) == [], backend
+        if backend == 'file':
+            assert [f for f in os.listdir(store.store_folder) if f.startswith(key.replace(':', '__'))] == []
+
+
+def test_compaction():
+    # the journal of a list is compacted, and the values are unchanged
+    if 'file' not in BACKENDS:
+        return
+    for backend, key in __backends():
+        if backend != 'file':
+            continue
+        n = JOURNAL_COMPACT_MIN + 10
+        for i in range(n):
+            rpush_key_store(key, i)
+            if i % 2 == 1:
+                rpop_key_store(key)
+        assert list_key_store(key) == list(range(n // 2, n)), backend
+        with open(store_folder + '/' + key.replace(':', '__') + '.jnl', 'rb') as f:
+            assert len(f.readlines()) < n
+
+
+
+def test_cache_updates():
+    # a value updated by another process is not read from the cache, even for quick updates of the same size
+    if 'file' not in BACKENDS:
+        return
+    set_use_sqlite(False)
+    key = 'test_api:%s' % uuid.uuid4().hex
+    cache = getattr(store, '__cache')
+    set_cache_store(60)
+    try:
+        for i in range(10, 30):
+            set_key_store(key, i)
+            assert get_key_store(key) == i
+            entry = cache[key]
+            set_key_store(key, i + 1)
+            # the entry read before the update is still in the cache of the other processes
+            cache[key] = entry
+            assert get_key_store(key) == i + 1
+        assert [f for f in os.listdir(store.store_folder) if f.startswith(key.replace(':', '__'))] == \
+            [key.replace(':', '__') + '.json']
+    finally:
+        set_cache_store(0)
+        del_key_store(key)
+        set_use_sqlite(get_config()['store'] == 'sqlite')
+
+
+def test_journals_cache():
+    # only the most recently used lists are kept in memory, the others are read again from their journal
+    if 'file' not in BACKENDS:
+        return
+    set_use_sqlite(False)
+    keys = ['test_api:%s' % uuid.uuid4().hex for i in range(JOURNAL_CACHE_MAX + 2)]
+    try:
+        for i, key in enumerate(keys):
+            rpush_key_store(key, i)
+        journals = getattr(store, '__journals')
+        assert len(journals) <= JOURNAL_CACHE_MAX
+        assert keys[0] not in journals and keys[-1] in journals
+        assert list_key_store(keys[0]) == [0]
+        assert keys[0] in journals and len(journals) <= JOURNAL_CACHE_MAX
+    finally:
+        for key in keys:
+            del_key_store(key)
+        set_use_sqlite(get_config()['store'] == 'sqlite')
+
+
+if __name__ == '__main__':
+    t = time.time()
+    test_list()
+    test_pop()
+    test_pop_dest()
+    test_copies()
+    test_pop_keys()
+    test_values()
+    test_codecs()
+    test_set()
+    test_counter()
+    test_delete()
+    test_compaction()
+    test_cache_updates()
+    test_journals_cache()
+    print('ok', BACKENDS, round(time.time() - t, 1))
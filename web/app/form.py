@@ -136,7 +136,7 @@ class ConfigForm(FlaskForm):
     graph_theme = SelectField(choices=[('dark', 'dark'),
                                        ('white', 'white'),
                                        ])
-    store = SelectField(choices=[('redis', 'redis'), ('file', 'file')])
+    store = SelectField(choices=[('redis', 'redis'), ('file', 'file'), ('sqlite', 'sqlite')])
     store_url = StringField('store_url')
 
 
@@ -1,8 +1,8 @@
 from app import app
 import os
-from flask import send_file, jsonify
+from flask import send_file, jsonify, abort
 from automlk.dataset import get_dataset, get_dataset_folder, create_dataset_json
-from automlk.results import create_predict_file
+from automlk.results import create_predict_file, create_model_file, get_round_graph
 from automlk.worker import create_model_json
 from automlk.context import get_config
 
@@ -53,12 +53,9 @@ def get_img_data(dataset_id, col):
 
 @app.route('/get_img_round/<string:dataset_id>/<string:round_id>/<string:graph_type>', methods=['GET'])
 def get_img_round(dataset_id, round_id, graph_type):
-    # retrieves the graph at dataset level from dataset_id;round_id, where dataset_id is dataset id and round_id is round id
-    if get_config()['graph_theme'] == 'dark':
-        return send_file(__path_data(dataset_id) + '/graphs_dark/%s_%s.png' % (graph_type, round_id),
-                         mimetype='image/png')
-    else:
-        return send_file(__path_data(dataset_id) + '/graphs/%s_%s.png' % (graph_type, round_id), mimetype='image/png')
+    # retrieves the graph of the round round_id, rendered the first time it is requested
+    filename = get_round_graph(dataset_id, round_id, graph_type, get_config()['graph_theme'] == 'dark')
+    return send_file(__path_filename(filename), mimetype='image/png')
 
 
 @app.route('/get_doc_html/<string:dataset_id>', methods=['GET'])
@@ -105,15 +102,21 @@ def get_model_json(dataset_id, round_id):
 
 @app.route('/get_pipeline/<string:dataset_id>/<string:round_id>', methods=['GET'])
 def get_pipeline(dataset_id, round_id):
-    # download the pipeline file (pickle)
-    return send_file(__path_data(dataset_id) + '/models/%s_pipe_model.pkl' % round_id,
+    # download the pipeline file (pickle), if the model of the round has been saved
+    filename = create_model_file(dataset_id, round_id, 'pipe_model')
+    if filename is None:
+        abort(404)
+    return send_file(__path_filename(filename),
                      as_attachment=True, attachment_filename='pipe_model_%s_%s.pkl' % (dataset_id, round_id))
 
 
 @app.route('/get_model/<string:dataset_id>/<string:round_id>', methods=['GET'])
 def get_model(dataset_id, round_id):
-    # download the model file (pickle)
-    return send_file(__path_data(dataset_id) + '/models/%s_model.pkl' % round_id,
+    # download the model file (pickle), if the model of the round has been saved
+    filename = create_model_file(dataset_id, round_id, 'model')
+    if filename is None:
+        abort(404)
+    return send_file(__path_filename(filename),
                      as_attachment=True, attachment_filename='model_%s_%s.pkl' % (dataset_id, round_id))
 
 